@@ -0,0 +1,89 @@
+import numpy as np
+from AprSolver import annuity_payment, annuity_rate
+from PortfolioClass import PORTFOLIO_COLUMNS
+
+# What each solver returns, keyed by the input it solves for
+SOLVE_FOR = ('house_price', 'cash', 'interest_rate')
+
+
+def _inputs(*values):
+    return np.broadcast_arrays(*[np.asarray(value, dtype=np.float64) for value in values])
+
+
+def affordable_debt(target_payment, interest_rate, loan_term_years, bank_fees_monthly=0):
+    """Largest debt whose monthly payment plus `bank_fees_monthly` stays within `target_payment`."""
+    target_payment, interest_rate, loan_term_years, bank_fees_monthly = _inputs(target_payment, interest_rate, loan_term_years, bank_fees_monthly)
+    # The payment is linear in the debt: payment = debt * payment per euro borrowed
+    per_euro = annuity_payment(interest_rate / 100 / 12, loan_term_years * 12, 1.0)
+    return (target_payment - bank_fees_monthly) / per_euro
+
+
+def max_house_price(target_payment, cash, interest_rate, loan_term_years, cost=0, taxes=6, bank_fees=0, bank_fees_monthly=0):
+    """Most expensive house whose monthly payment plus fees stays within `target_payment`, in closed form.
+
+    Same cost model as MortgageCalculator: debt = house_price * (1 + 2 * taxes%) + 2 * (cost + bank_fees) - cash.
+    Works on scalars or arrays (one element per applicant); NaN where no valid loan exists,
+    i.e. where the cash would exceed the house price plus its costs.
+    """
+    target_payment, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly = _inputs(
+        target_payment, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)
+    debt = affordable_debt(target_payment, interest_rate, loan_term_years, bank_fees_monthly)
+    tax_share = taxes / 100
+    fixed_costs = cost + bank_fees
+    house_price = (debt - 2 * fixed_costs + cash) / (1 + 2 * tax_share)
+    # MortgageCalculator rejects a down payment above the house price
+    down_payment = cash - (tax_share * house_price + fixed_costs)
+    return np.where((debt > 0) & (down_payment <= house_price), house_price, np.nan)
+
+
+def min_cash(target_payment, house_price, interest_rate, loan_term_years, cost=0, taxes=6, bank_fees=0, bank_fees_monthly=0):
+    """Least cash needed to keep the monthly payment plus fees within `target_payment`, in closed form.
+
+    Zero where no cash is needed; NaN where the target does not even cover the monthly fees.
+    """
+    target_payment, house_price, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly = _inputs(
+        target_payment, house_price, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)
+    debt = affordable_debt(target_payment, interest_rate, loan_term_years, bank_fees_monthly)
+    cash = house_price * (1 + 2 * taxes / 100) + 2 * (cost + bank_fees) - debt
+    return np.where(target_payment > bank_fees_monthly, np.maximum(cash, 0), np.nan)
+
+
+def max_interest_rate(target_payment, house_price, cash, loan_term_years, cost=0, taxes=6, bank_fees=0, bank_fees_monthly=0):
+    """Highest annual interest rate (%) at which the monthly payment plus fees stays within `target_payment`.
+
+    The annuity cannot be inverted for the rate in closed form, so this runs the vectorized
+    Newton solver of AprSolver. NaN where even a zero rate is not affordable.
+    """
+    target_payment, house_price, cash, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly = _inputs(
+        target_payment, house_price, cash, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)
+    taxes_cost_fees = taxes / 100 * house_price + cost + bank_fees
+    debt = taxes_cost_fees + house_price - (cash - taxes_cost_fees)
+    months = loan_term_years * 12
+    payment = target_payment - bank_fees_monthly
+    monthly_rate = annuity_rate(debt, payment, months)
+    # A payment at or below debt / months only repays the loan at a negative rate
+    return np.where(payment * months > debt, monthly_rate * 12 * 100, np.nan)
+
+
+def affordability_batch(df, solve_for='house_price'):
+    """Solve for `solve_for` on every row of a DataFrame with a `target_payment` column.
+
+    The other PORTFOLIO_COLUMNS inputs are read from the frame (optional ones take their
+    defaults); the column being solved for is ignored if present. Returns an array.
+    """
+    if solve_for not in SOLVE_FOR:
+        raise ValueError(f"Unknown solve_for '{solve_for}', expected one of {list(SOLVE_FOR)}.")
+    required = ['target_payment'] + [column for column, default in PORTFOLIO_COLUMNS.items()
+                                     if default is None and column != solve_for]
+    missing = [column for column in required if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    inputs = {column: df[column].to_numpy(dtype=np.float64) if column in df.columns else default
+              for column, default in PORTFOLIO_COLUMNS.items() if column != solve_for}
+    target_payment = df['target_payment'].to_numpy(dtype=np.float64)
+    if solve_for == 'house_price':
+        return max_house_price(target_payment, **inputs)
+    if solve_for == 'cash':
+        return min_cash(target_payment, **inputs)
+    return max_interest_rate(target_payment, **inputs)
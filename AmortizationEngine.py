@@ -0,0 +1,348 @@
+import math
+import numpy as np
+from ScheduleClass import AmortizationSchedule
+from AprSolver import annuity_payment, annuity_periods
+from ProfilerClass import count
+# Extra payment type codes live with the sparse plan and are re-exported here
+from PrepaymentClass import TYPE_NONE, TYPE_TERM, TYPE_FEE, TYPE_CODES, PrepaymentPlan
+
+
+def prepayment_plan(amortization_schedule, months):
+    """Validated PrepaymentPlan within `months` from an extra amortization DataFrame (or a plan)."""
+    if isinstance(amortization_schedule, PrepaymentPlan):
+        return amortization_schedule.truncate(months)
+    return PrepaymentPlan.from_frame(amortization_schedule, months)
+
+
+def extra_payment_arrays(amortization_schedule, months):
+    """Return (amounts, type codes) arrays of length `months` from an extra amortization DataFrame or plan."""
+    if amortization_schedule is None:
+        return np.zeros(int(months), dtype=np.float64), np.zeros(int(months), dtype=np.int8)
+    return prepayment_plan(amortization_schedule, months).dense(months)
+
+
+def _state(monthly_payment, remaining_months, remaining_balance, total_interest_paid):
+    return {
+        'monthly_payment': monthly_payment,
+        'remaining_months': remaining_months,
+        'remaining_balance': remaining_balance,
+        'total_interest_paid': total_interest_paid,
+    }
+
+
+def _new_schedule(debt, monthly_rate, months, extra_amounts, extra_types):
+    months = int(months)
+    schedule = AmortizationSchedule(months)
+    schedule.debt = debt
+    schedule.monthly_rate = monthly_rate
+    if extra_amounts is not None:
+        schedule.extra_amounts[:] = extra_amounts
+        schedule.extra_types[:] = extra_types
+    schedule.initial_state = _state(annuity_payment(monthly_rate, months, debt), months, debt, 0)
+    return schedule
+
+
+def _apply_extra_payment(monthly_rate, monthly_payment, remaining_months, remaining_balance, extra_payment, amort_type):
+    """Update term or payment after an extra amortization, as the monthly loop does."""
+    if amort_type == TYPE_TERM:
+        remaining_months = int(annuity_periods(monthly_rate, monthly_payment, remaining_balance) + 0.5)
+    elif amort_type == TYPE_FEE:
+        remaining_months -= 1
+        monthly_payment = annuity_payment(monthly_rate, remaining_months, remaining_balance)
+    return monthly_payment, remaining_months
+
+
+def amortization_schedule_loop(debt, monthly_rate, months, extra_amounts=None, extra_types=None):
+    """Reference month-by-month amortization schedule."""
+    months = int(months)
+    schedule = _new_schedule(debt, monthly_rate, months, extra_amounts, extra_types)
+    monthly_payment = annuity_payment(monthly_rate, months, debt)
+    remaining_months = months
+    remaining_balance = debt
+    total_interest_paid = 0
+    months_filled = 0
+
+    for month in range(1, months + 1):
+        extra_payment = 0
+        amort_type = TYPE_NONE
+
+        if extra_amounts is not None:
+            extra_payment = extra_amounts[month - 1]
+            amort_type = extra_types[month - 1]
+
+        interest_payment = remaining_balance * monthly_rate
+        regular_debt = monthly_payment - interest_payment
+        debt_payment = monthly_payment - interest_payment + extra_payment
+
+        # Prevent over payment (if the remaining balance is less than the debt payment)
+        if remaining_balance - debt_payment < 0.01:
+            debt_payment = remaining_balance
+            actual_payment = debt_payment + interest_payment
+        else:
+            actual_payment = monthly_payment
+
+        total_interest_paid += interest_payment
+        remaining_balance -= debt_payment
+        remaining_balance = max(0, remaining_balance)
+
+        if extra_payment != 0:
+            monthly_payment, remaining_months = _apply_extra_payment(
+                monthly_rate, monthly_payment, remaining_months, remaining_balance, extra_payment, amort_type)
+        else:
+            remaining_months -= 1
+
+        i = month - 1
+        schedule.monthly_payment[i] = monthly_payment
+        schedule.total_payment[i] = actual_payment + extra_payment
+        schedule.regular_amortization[i] = regular_debt
+        schedule.additional_amortization[i] = extra_payment
+        schedule.total_amortization[i] = debt_payment
+        schedule.interest[i] = interest_payment
+        schedule.remaining_balance[i] = remaining_balance
+        schedule.accrued_interest[i] = total_interest_paid
+        schedule.remaining_months[i] = remaining_months
+        months_filled = month
+
+        if remaining_balance <= 0.01 or remaining_months <= 0:
+            break
+
+    schedule.truncate(months_filled)
+    schedule.final_state = _state(monthly_payment, remaining_months, remaining_balance, total_interest_paid)
+    return schedule, schedule.final_state
+
+
+def _annuity_balances(balance, monthly_payment, monthly_rate, length):
+    """Closed-form balance after each of `length` level payments."""
+    k = np.arange(1, length + 1, dtype=np.float64)
+    if monthly_rate == 0:
+        return balance - monthly_payment * k
+    growth = np.power(1 + monthly_rate, k)
+    return balance * growth - monthly_payment * (growth - 1) / monthly_rate
+
+
+def amortization_schedule(debt, monthly_rate, months, extra_amounts=None, extra_types=None):
+    """Vectorized amortization schedule.
+
+    Stretches without extra payments are computed in closed form; only the months with
+    an extra payment are stepped one by one. Output matches `amortization_schedule_loop`.
+    """
+    schedule = _new_schedule(debt, monthly_rate, months, extra_amounts, extra_types)
+    return schedule, resume_schedule(schedule, 1)
+
+
+def resume_schedule(schedule, month, state=None):
+    """Recompute `schedule` from `month` to the end and return the final state.
+
+    Rows before `month` are kept; `state` defaults to the state stored at the end of
+    the previous month, so an edit at month k only costs the remaining n - k months.
+    """
+    if state is None:
+        state = schedule.state_at(month)
+    monthly_rate = schedule.monthly_rate
+    months = len(schedule.payment_number)
+    extra_amounts = schedule.extra_amounts
+    extra_types = schedule.extra_types
+    monthly_payment = state['monthly_payment']
+    remaining_months = state['remaining_months']
+    remaining_balance = state['remaining_balance']
+    total_interest_paid = state['total_interest_paid']
+
+    event_months = np.flatnonzero(extra_amounts[month - 1:] != 0) + month
+    event_months = np.append(event_months, months + 1)
+    first_month = month
+
+    next_event = 0
+    while month <= months:
+        while event_months[next_event] < month:
+            next_event += 1
+        event_month = event_months[next_event]
+
+        # Regular payments up to the next extra payment
+        length = min(event_month - month, remaining_months)
+        if length > 0:
+            after = _annuity_balances(remaining_balance, monthly_payment, monthly_rate, length)
+            stop = np.flatnonzero(after <= 0.01)
+            if stop.size:
+                length = stop[0] + 1
+                after = after[:length]
+            before = np.empty(length, dtype=np.float64)
+            before[0] = remaining_balance
+            before[1:] = after[:-1]
+            interest = before * monthly_rate
+            regular = monthly_payment - interest
+            debt_payment = regular.copy()
+            actual = np.full(length, monthly_payment)
+
+            if after[-1] < 0.01:
+                debt_payment[-1] = before[-1]
+                actual[-1] = before[-1] + interest[-1]
+                after[-1] = 0
+            after = np.maximum(after, 0)
+
+            accrued = np.cumsum(np.concatenate(([total_interest_paid], interest)))[1:]
+            seg = slice(month - 1, month - 1 + length)
+            schedule.monthly_payment[seg] = monthly_payment
+            schedule.total_payment[seg] = actual
+            schedule.regular_amortization[seg] = regular
+            schedule.additional_amortization[seg] = 0
+            schedule.total_amortization[seg] = debt_payment
+            schedule.interest[seg] = interest
+            schedule.remaining_balance[seg] = after
+            schedule.accrued_interest[seg] = accrued
+            schedule.remaining_months[seg] = remaining_months - np.arange(1, length + 1)
+
+            month += length
+            remaining_months -= length
+            remaining_balance = after[-1]
+            total_interest_paid = accrued[-1]
+            if remaining_balance <= 0.01 or remaining_months <= 0:
+                break
+
+        if month > months:
+            break
+
+        # Month with an extra payment
+        extra_payment = extra_amounts[month - 1]
+        interest_payment = remaining_balance * monthly_rate
+        regular_debt = monthly_payment - interest_payment
+        debt_payment = monthly_payment - interest_payment + extra_payment
+
+        if remaining_balance - debt_payment < 0.01:
+            debt_payment = remaining_balance
+            actual_payment = debt_payment + interest_payment
+        else:
+            actual_payment = monthly_payment
+
+        total_interest_paid += interest_payment
+        remaining_balance = max(0, remaining_balance - debt_payment)
+        monthly_payment, remaining_months = _apply_extra_payment(
+            monthly_rate, monthly_payment, remaining_months, remaining_balance, extra_payment, extra_types[month - 1])
+
+        i = month - 1
+        schedule.monthly_payment[i] = monthly_payment
+        schedule.total_payment[i] = actual_payment + extra_payment
+        schedule.regular_amortization[i] = regular_debt
+        schedule.additional_amortization[i] = extra_payment
+        schedule.total_amortization[i] = debt_payment
+        schedule.interest[i] = interest_payment
+        schedule.remaining_balance[i] = remaining_balance
+        schedule.accrued_interest[i] = total_interest_paid
+        schedule.remaining_months[i] = remaining_months
+        month += 1
+
+        if remaining_balance <= 0.01 or remaining_months <= 0:
+            break
+
+    schedule.truncate(month - 1)
+    count('schedule.months_computed', month - first_month)
+    schedule.final_state = _state(monthly_payment, remaining_months, remaining_balance, total_interest_paid)
+    return schedule.final_state
+
+
+def _nper(monthly_rate, monthly_payment, balance):
+    """Scalar annuity_periods(monthly_rate, monthly_payment, balance)."""
+    if monthly_rate == 0:
+        # numpy_financial returns pv / pmt at a zero rate, which is negative here
+        return -balance / monthly_payment
+    return math.log(monthly_payment / (monthly_payment - balance * monthly_rate)) / math.log1p(monthly_rate)
+
+
+def _pmt(monthly_rate, months, balance):
+    """Scalar annuity_payment(monthly_rate, months, balance)."""
+    if months <= 0:
+        return math.nan
+    if monthly_rate == 0:
+        return balance / months
+    return balance * monthly_rate / -math.expm1(-months * math.log1p(monthly_rate))
+
+
+def _annuity_balance(balance, monthly_payment, monthly_rate, months):
+    if monthly_rate == 0:
+        return balance - monthly_payment * months
+    growth = (1 + monthly_rate) ** months
+    return balance * growth - monthly_payment * (growth - 1) / monthly_rate
+
+
+def _payoff_months(balance, monthly_payment, monthly_rate):
+    """Number of regular payments until the balance falls to 0.01 or below (inf if never)."""
+    if monthly_rate == 0:
+        months = (balance - 0.01) / monthly_payment if monthly_payment > 0 else math.inf
+    elif monthly_payment <= balance * monthly_rate:
+        return math.inf
+    else:
+        level = monthly_payment / monthly_rate
+        months = math.log((level - 0.01) / (level - balance)) / math.log1p(monthly_rate)
+    months = max(1, math.ceil(months))
+    # Guard against rounding at the boundary
+    while months > 1 and _annuity_balance(balance, monthly_payment, monthly_rate, months - 1) <= 0.01:
+        months -= 1
+    while _annuity_balance(balance, monthly_payment, monthly_rate, months) > 0.01:
+        months += 1
+    return months
+
+
+def amortization_summary(debt, monthly_rate, months, events=()):
+    """Total interest and final state of a schedule without building its rows.
+
+    `events` is a PrepaymentPlan or an iterable of (month, amount, type code) extra payments. Regular stretches
+    are evaluated in closed form, so the cost grows with the number of events rather than
+    with the number of months. Matches `amortization_schedule` up to floating point error.
+    """
+    months = int(months)
+    monthly_payment = _pmt(monthly_rate, months, debt)
+    remaining_months = months
+    remaining_balance = debt
+    total_interest_paid = 0.0
+    month = 1
+
+    if isinstance(events, PrepaymentPlan):
+        events = events.events()
+    events = sorted(event for event in events if event[1] != 0)
+    for event_month, extra_payment, amort_type in events + [(months + 1, 0, TYPE_NONE)]:
+        if event_month < month:
+            continue
+
+        # Regular payments up to the event
+        length = min(event_month, months + 1) - month
+        length = min(length, remaining_months)
+        if length > 0:
+            payoff = _payoff_months(remaining_balance, monthly_payment, monthly_rate)
+            if payoff <= length:
+                balance = _annuity_balance(remaining_balance, monthly_payment, monthly_rate, payoff)
+                total_interest_paid += payoff * monthly_payment - (remaining_balance - balance)
+                remaining_balance = 0.0 if balance < 0.01 else balance
+                remaining_months -= payoff
+                month += payoff
+                break
+            balance = _annuity_balance(remaining_balance, monthly_payment, monthly_rate, length)
+            total_interest_paid += length * monthly_payment - (remaining_balance - balance)
+            remaining_balance = balance
+            remaining_months -= length
+            month += length
+            if remaining_months <= 0:
+                break
+
+        if month > months:
+            break
+
+        # Month with the extra payment
+        interest_payment = remaining_balance * monthly_rate
+        debt_payment = monthly_payment - interest_payment + extra_payment
+        if remaining_balance - debt_payment < 0.01:
+            debt_payment = remaining_balance
+        total_interest_paid += interest_payment
+        remaining_balance = max(0, remaining_balance - debt_payment)
+
+        if amort_type == TYPE_TERM:
+            remaining_months = int(_nper(monthly_rate, monthly_payment, remaining_balance) + 0.5)
+        elif amort_type == TYPE_FEE:
+            remaining_months -= 1
+            monthly_payment = _pmt(monthly_rate, remaining_months, remaining_balance)
+        month += 1
+
+        if remaining_balance <= 0.01 or remaining_months <= 0:
+            break
+
+    state = _state(monthly_payment, remaining_months, remaining_balance, total_interest_paid)
+    state['months_paid'] = month - 1
+    return state
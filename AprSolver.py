@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def _annuity_factor(rate, months):
+    """Present value of 1 paid monthly for `months` months, and its derivative with respect to `rate`."""
+    small = np.abs(rate) < 1e-9
+    safe_rate = np.where(small, 1.0, rate)
+    discount = np.exp(-months * np.log1p(safe_rate))
+    factor = -np.expm1(-months * np.log1p(safe_rate)) / safe_rate
+    derivative = (months * discount / (1 + safe_rate) - factor) / safe_rate
+
+    # Second order expansion around a zero rate
+    factor = np.where(small, months - months * (months + 1) / 2 * rate, factor)
+    derivative = np.where(small, -months * (months + 1) / 2 + months * (months + 1) * (months + 2) / 3 * rate, derivative)
+    return factor, derivative
+
+
+def annuity_payment(rate, months, principal):
+    """Level payment repaying `principal` over `months` periods; same arithmetic as -npf.pmt(rate, months, principal)."""
+    rate, months, principal = np.asarray(rate), np.asarray(months), np.asarray(principal)
+    growth = (1 + rate) ** months
+    zero = rate == 0
+    safe_rate = np.where(zero, 1, rate)
+    factor = np.where(zero, months, (growth - 1) / safe_rate)
+    return principal * growth / factor
+
+
+def annuity_periods(rate, payment, principal):
+    """Number of level payments repaying `principal`; same arithmetic as npf.nper(rate, -payment, principal)."""
+    rate, payment, principal = np.asarray(rate), -np.asarray(payment), np.asarray(principal)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        level = payment / rate
+        periods = np.log(level / (principal + level)) / np.log(1 + rate)
+        # numpy_financial returns pv / pmt at a zero rate, which is negative here
+        return np.where(rate == 0, principal / payment, periods)
+
+
+def annuity_rate(principal, payment, months, guess=None, tol=1e-15, max_iter=50):
+    """Monthly rate at which `months` level payments repay `principal`.
+
+    Newton iteration on the annuity equation with its analytic derivative. Works on
+    scalars or arrays; only loans that have not converged yet are iterated. Loans
+    without a solution return NaN.
+    """
+    principal, payment, months, rate = np.broadcast_arrays(
+        np.asarray(principal, dtype=np.float64),
+        np.asarray(payment, dtype=np.float64),
+        np.asarray(months, dtype=np.float64),
+        np.asarray(0.0 if guess is None else guess, dtype=np.float64),
+    )
+    shape = rate.shape
+    principal, payment, months = principal.ravel(), payment.ravel(), months.ravel()
+    rate = rate.ravel().copy()
+
+    valid = (principal > 0) & (payment > 0) & (months > 0)
+    active = np.flatnonzero(valid)
+    for _ in range(max_iter):
+        if not active.size:
+            break
+        factor, derivative = _annuity_factor(rate[active], months[active])
+        step = (payment[active] * factor - principal[active]) / (payment[active] * derivative)
+        updated = np.maximum(rate[active] - step, -0.999999)
+        rate[active] = updated
+        active = active[np.abs(step) > tol * np.maximum(1, np.abs(updated))]
+
+    rate[~valid] = np.nan
+    return rate.reshape(shape) if shape else rate[0]
+
+
+def cash_flow_rate(principal, payments, guess=0.0, tol=1e-15, max_iter=100):
+    """Monthly rate at which an irregular series of monthly `payments` repays `principal`.
+
+    General fallback for schedules that are not a level annuity (extra amortizations,
+    payment changes). Newton iteration on the net present value with its analytic derivative.
+    """
+    payments = np.asarray(payments, dtype=np.float64)
+    if principal <= 0 or payments.size == 0 or payments.sum() <= 0:
+        return np.nan
+
+    periods = np.arange(1, payments.size + 1, dtype=np.float64)
+    rate = float(guess)
+    for _ in range(max_iter):
+        discount = np.exp(-periods * np.log1p(rate))
+        value = payments @ discount - principal
+        derivative = -(payments * periods) @ discount / (1 + rate)
+        step = value / derivative
+        rate = max(rate - step, -0.999999)
+        if abs(step) <= tol * max(1, abs(rate)):
+            break
+    return rate
+
+
+def annual_percentage_rate(monthly_rate):
+    """Effective annual rate, in percent, of a monthly rate."""
+    return ((1 + monthly_rate) ** 12 - 1) * 100
@@ -0,0 +1,102 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """Raised when waiting on a job that was replaced by a newer one."""
+
+
+class BackgroundJob:
+    """Named steps run in order on a worker thread; each result is published as soon as it is ready.
+
+    A step is a function of the results dict so far. Cancellation is checked between steps,
+    so a stale job stops at the next step boundary instead of running to the end.
+    """
+
+    def __init__(self, key, steps):
+        self.key = key
+        self.steps = list(steps)
+        self.results = {}
+        self.error = None
+        self.finished = False
+        self.timings = {}
+        self._cancelled = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._changed:
+            self._changed.notify_all()
+
+    def run(self):
+        try:
+            for name, func in self.steps:
+                if self.cancelled:
+                    return
+                start = time.perf_counter()
+                value = func(self.results)
+                with self._changed:
+                    self.results[name] = value
+                    self.timings[name] = time.perf_counter() - start
+                    self._changed.notify_all()
+        except Exception as error:
+            self.error = error
+        finally:
+            with self._changed:
+                self.finished = True
+                self._changed.notify_all()
+
+    def ready(self, name):
+        return name in self.results
+
+    def wait(self, name, timeout=None):
+        """Block until step `name` is done or `timeout` seconds pass; True when its result is ready."""
+        with self._changed:
+            self._changed.wait_for(lambda: name in self.results or self.finished or self.cancelled, timeout)
+        return self.ready(name)
+
+    def result(self, name):
+        """Result of step `name`; re-raises the error of a failed step."""
+        if name in self.results:
+            return self.results[name]
+        if self.error is not None:
+            raise self.error
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.key} was cancelled.")
+        raise ValueError(f"Step '{name}' is not ready.")
+
+
+class BackgroundRunner:
+    """Run one job at a time for a caller (e.g. one app session) on a shared thread pool.
+
+    Submitting a job with the key of the current one returns it, so a rerun with unchanged
+    inputs picks up the computation in flight; a new key cancels the previous job.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix='mortgage-background')
+        self.job = None
+        self.cancelled = 0
+        self._future = None
+        self._lock = threading.Lock()
+
+    def submit(self, key, steps):
+        with self._lock:
+            job = self.job
+            if job is not None and job.key == key and job.error is None and not job.cancelled:
+                return job
+            if job is not None and not job.finished:
+                job.cancel()
+                # Not started yet: drop it from the queue altogether
+                self._future.cancel()
+                self.cancelled += 1
+            self.job = BackgroundJob(key, steps)
+            # The job sees the caller's context, e.g. its session profiler
+            self._future = self.executor.submit(contextvars.copy_context().run, self.job.run)
+            return self.job
@@ -0,0 +1,188 @@
+import sys
+import time
+import argparse
+import resource
+
+import numpy as np
+import pandas as pd
+from PortfolioClass import PORTFOLIO_COLUMNS, portfolio_from_frame
+from AmortizationEngine import amortization_schedule
+from ScheduleClass import SCHEDULE_COLUMNS
+from ResultStore import SUMMARY_COLUMNS, ResultStore, cached_results, portfolio_hashes, schedule_from_columns
+from ScheduleArchive import ScheduleArchiveWriter
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def read_chunks(path, chunk_size, delimiter=';'):
+    """Yield DataFrames of at most `chunk_size` loans from a CSV or Parquet file."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, delimiter=delimiter, chunksize=chunk_size)
+
+
+class ResultWriter:
+    """Append DataFrames to a Parquet (or CSV) file one chunk at a time."""
+
+    def __init__(self, path, delimiter=';'):
+        self.path = path
+        self.delimiter = delimiter
+        self._writer = None
+        self._header = True
+
+    def write(self, df):
+        if self.path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            df.to_csv(self.path, sep=self.delimiter, index=False, mode='w' if self._header else 'a', header=self._header)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def summarize_chunk(chunk, portfolio, first_row, results=None):
+    """Inputs plus summary metrics of one chunk, with a stable float64 schema.
+
+    `results` overrides `portfolio.results()`, e.g. when they come from a ResultStore.
+    """
+    summary = pd.DataFrame({
+        'loan_id': chunk['loan_id'].to_numpy() if 'loan_id' in chunk.columns else np.arange(first_row, first_row + len(chunk)),
+    })
+    for column in PORTFOLIO_COLUMNS:
+        summary[column] = getattr(portfolio, column).astype(np.float64)
+    summary['interest_rate'] *= 100
+    for name, values in (results or portfolio.results()).items():
+        summary[name] = values.astype(np.float64)
+    return summary
+
+
+def schedule_batches(loan_ids, portfolio, batch_size, store=None, results=None):
+    """Yield (loan ids, AmortizationSchedules) for the valid loans of a chunk, `batch_size` loans at a time.
+
+    With a ResultStore, stored schedules are reused and the computed ones are written back
+    together with their summary `results` ({column: array} over the chunk).
+    """
+    valid = np.flatnonzero(portfolio.valid)
+    if store is not None:
+        k1, k2 = portfolio_hashes(portfolio)
+    for start in range(0, len(valid), batch_size):
+        batch = valid[start:start + batch_size]
+        stored = store.get_schedules(k1[batch], k2[batch]) if store is not None else {}
+        schedules = [schedule_from_columns(stored[j]) if j in stored else
+                     amortization_schedule(portfolio.debt[i], portfolio.monthly_rate[i], portfolio.loan_term_months[i])[0]
+                     for j, i in enumerate(batch)]
+        computed = [j for j in range(len(batch)) if j not in stored]
+        if store is not None and computed:
+            rows = batch[computed]
+            store.put_schedules(k1[rows], k2[rows], {column: results[column][rows] for column in SUMMARY_COLUMNS},
+                                [schedules[j] for j in computed])
+        yield loan_ids[batch], schedules
+
+
+def schedule_frame(loan_ids, schedules):
+    """Full monthly schedules of several loans as one long DataFrame."""
+    columns = {'loan_id': np.repeat(loan_ids, [len(schedule) for schedule in schedules])}
+    for name, (field, rounded) in SCHEDULE_COLUMNS.items():
+        values = np.concatenate([schedule.column(field) for schedule in schedules])
+        columns[name] = np.round(values, 2) if rounded else values
+    return pd.DataFrame(columns)
+
+
+def run_pipeline(input_path, output_path, schedules_path=None, chunk_size=100000, schedule_batch_size=1000, delimiter=';', verbose=True, store=None,
+                 schedule_archive_path=None):
+    """Stream loans from `input_path` and write summaries (and optionally schedules) chunk by chunk.
+
+    Schedules go to `schedules_path` as a long table (Parquet or CSV) and/or to
+    `schedule_archive_path` as a memory-mappable ScheduleArchive directory.
+    With a ResultStore, loans already in the store are not priced again, and their
+    schedules (when written) are not recomputed either.
+    """
+    start = time.perf_counter()
+    rows = 0
+    summary_writer = ResultWriter(output_path, delimiter)
+    schedule_writer = ResultWriter(schedules_path, delimiter) if schedules_path else None
+    archive_writer = ScheduleArchiveWriter(schedule_archive_path) if schedule_archive_path else None
+
+    try:
+        for chunk in read_chunks(input_path, chunk_size, delimiter):
+            # Invalid loans are reported as NaN instead of stopping the whole job
+            portfolio = portfolio_from_frame(chunk, validate=False)
+            if store is not None:
+                results = cached_results(portfolio, store)
+            else:
+                portfolio.run()
+                results = portfolio.results()
+            summary = summarize_chunk(chunk, portfolio, rows, results)
+            summary_writer.write(summary)
+
+            if schedule_writer is not None or archive_writer is not None:
+                for loan_ids, schedules in schedule_batches(summary['loan_id'].to_numpy(), portfolio, schedule_batch_size, store, results):
+                    if schedule_writer is not None:
+                        schedule_writer.write(schedule_frame(loan_ids, schedules))
+                    if archive_writer is not None:
+                        archive_writer.write(loan_ids, schedules)
+
+            rows += len(chunk)
+            if verbose:
+                elapsed = time.perf_counter() - start
+                print(f"{rows} loans, {rows / elapsed:,.0f} rows/s, peak RSS {peak_rss_mb():,.0f} MB", file=sys.stderr)
+    finally:
+        summary_writer.close()
+        if schedule_writer is not None:
+            schedule_writer.close()
+        if archive_writer is not None:
+            archive_writer.close()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed else float('nan'),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if store is not None:
+        stats['store'] = store.stats()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price a loan file (CSV or Parquet) in chunks.")
+    parser.add_argument('input', help="Loans file, one loan per row (.csv or .parquet)")
+    parser.add_argument('output', help="Summary output file (.parquet or .csv)")
+    parser.add_argument('--schedules', help="Optional output file for the full monthly schedules")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Loans per chunk")
+    parser.add_argument('--schedule-archive', help="Optional directory for the full monthly schedules as memory-mappable .npy files")
+    parser.add_argument('--schedule-batch-size', type=int, default=1000, help="Loans per written schedule batch")
+    parser.add_argument('--delimiter', default=';', help="CSV delimiter")
+    parser.add_argument('--store', help="ResultStore database; loans already in it are not recomputed")
+    parser.add_argument('--store-max-mb', type=float, default=1024, help="Size limit of the result store in MB")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store, int(args.store_max_mb * 2**20)) if args.store else None
+    stats = run_pipeline(args.input, args.output, args.schedules, args.chunk_size, args.schedule_batch_size, args.delimiter, store=store,
+                         schedule_archive_path=args.schedule_archive)
+    print(f"Processed {stats['rows']} loans in {stats['seconds']:.2f} s "
+          f"({stats['rows_per_second']:,.0f} rows/s), peak RSS {stats['peak_rss_mb']:,.0f} MB")
+    if store is not None:
+        print(f"Result store: {stats['store']['hits']} lookups reused, {stats['store']['misses']} computed, "
+              f"{stats['store']['entries']} entries ({stats['store']['bytes'] / 2**20:,.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
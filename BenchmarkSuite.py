@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+import numpy as np
+import pandas as pd
+from MortgageClass import MortgageCalculator
+from PortfolioClass import MortgagePortfolio, calculate_batch, portfolio_from_frame
+
+# Default scenario of the app (streamlit_params.yaml)
+LOAN = dict(house_price=425000, cash=70000, interest_rate=1.8, cost=2000, taxes=6, bank_fees=2000, bank_fees_monthly=10)
+
+FIGURE_PARAMS = {
+    'color_bg': "#616161",
+    'color_box': "#e0e0e0",
+    'color_line': "#FFFFFF",
+    'color_text': "#FFFFFF",
+    'color_text_third': "#202020",
+}
+
+
+def prepayment_frame(months=360, amount=1500, amort_type='Term'):
+    """Extra amortization table with a payment every month, like amortization_schedule.csv."""
+    return pd.DataFrame({'Month': np.arange(1, months + 1), 'Amortization': amount, 'Type': amort_type})
+
+
+def loan_frame(n_loans, seed=0):
+    """Random but reproducible portfolio of valid loans."""
+    rng = np.random.default_rng(seed)
+    house_price = rng.uniform(100000, 1000000, n_loans).round(-3)
+    return pd.DataFrame({
+        'house_price': house_price,
+        'cash': (house_price * rng.uniform(0.1, 0.4, n_loans)).round(-3),
+        'interest_rate': rng.uniform(0.5, 6, n_loans).round(2),
+        'loan_term_years': rng.integers(10, 41, n_loans),
+        'cost': 2000,
+        'bank_fees': 2000,
+        'bank_fees_monthly': 10,
+    })
+
+
+def measure(func, repeat=20, number=1):
+    """Run `func` `number` times per sample, `repeat` samples; times in ms per call."""
+    func()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number * 1000)
+    return {'median_ms': float(np.median(samples)), 'min_ms': float(np.min(samples)), 'repeat': repeat, 'number': number}
+
+
+def calculator_cases():
+    cases = {}
+    for years in (10, 30, 40):
+        for label, extra in (('', None), ('_prepayment', prepayment_frame())):
+            def run(years=years, extra=extra):
+                MortgageCalculator(loan_term_years=years, amortization_schedule_df=extra, **LOAN).run()
+            cases[f"run_{years}y{label}"] = (run, 50, 1)
+
+            mortgage = MortgageCalculator(loan_term_years=years, amortization_schedule_df=extra, **LOAN)
+            mortgage.create_extra_amortization_schedule()
+            cases[f"schedule_{years}y{label}"] = (mortgage.create_amortization_schedule, 50, 5)
+        cases[f"apr_{years}y"] = (MortgageCalculator(loan_term_years=years, **LOAN).calculate_apr, 50, 20)
+    return cases
+
+
+def batch_cases():
+    cases = {}
+    for n_loans, repeat in ((1000, 50), (100000, 5)):
+        df = loan_frame(n_loans)
+        cases[f"batch_{n_loans}"] = ((lambda df=df: calculate_batch(df)), repeat, 1)
+
+        def cents(df=df):
+            portfolio = portfolio_from_frame(df)
+            portfolio.rounding = 'half_even'
+            portfolio.run()
+        cases[f"batch_{n_loans}_cents"] = (cents, repeat, 1)
+    return cases
+
+
+def affordability_cases():
+    from AffordabilitySolver import affordability_batch
+    df = loan_frame(100000)
+    df['target_payment'] = 1500
+    return {f"affordability_{solve_for}_100000": ((lambda solve_for=solve_for: affordability_batch(df, solve_for)), 10, 1)
+            for solve_for in ('house_price', 'cash', 'interest_rate')}
+
+
+def figure_cases():
+    from GraphicClass import GraphicClass
+    mortgage = MortgageCalculator(loan_term_years=30, **LOAN)
+    mortgage.run()
+    enhanced = MortgageCalculator(loan_term_years=30, amortization_schedule_df=prepayment_frame(), **LOAN)
+    enhanced.run()
+    graphics = GraphicClass([mortgage, enhanced], FIGURE_PARAMS)
+    return {
+        # New figure every call vs. data swapped into the reused skeleton
+        'figure_monthly_payment': ((lambda: GraphicClass([mortgage, enhanced], FIGURE_PARAMS).monthly_payment_graph()), 10, 1),
+        'figure_monthly_payment_update': (graphics.monthly_payment_graph, 20, 1),
+    }
+
+
+def dense_prepayment_loans(n_loans):
+    """(debt, monthly rate, months, extra amounts, extra types) with an extra payment in about a third of the months."""
+    portfolio = MortgagePortfolio(**loan_frame(n_loans).to_dict('series'))
+    rng = np.random.default_rng(0)
+    months = portfolio.loan_term_months.astype(np.int64)
+    extra_amounts = np.where(rng.random((len(months), months.max())) < 0.3, 500.0, 0)
+    extra_types = rng.integers(1, 3, extra_amounts.shape).astype(np.int8)
+    return portfolio.debt, portfolio.monthly_rate, months, extra_amounts, extra_types
+
+
+def kernel_cases():
+    from JitEngine import batch_schedule_summary
+    loans = dense_prepayment_loans(1000)
+    return {'schedules_1000_dense': ((lambda: batch_schedule_summary(*loans)), 3, 1)}
+
+
+def parallel_cases():
+    # Per-loan prepayment schedules, serial and spread over every core; `speedup` compares the two
+    from JitEngine import batch_schedule_summary
+    from ParallelClass import ParallelExecutor
+    loans = dense_prepayment_loans(2000)
+    executor = ParallelExecutor(chunk_size=100)
+    return {
+        'schedules_2000_serial': ((lambda: batch_schedule_summary(*loans)), 3, 1),
+        'schedules_2000_parallel': ((lambda: executor.schedule_summary(*loans)), 3, 1),
+    }
+
+
+def scenario_cases():
+    from ScenarioClass import ScenarioSet
+    scenarios = ScenarioSet(dict(LOAN, loan_term_years=30))
+    # Ten offers: rates and fees vary, every other one with monthly prepayments
+    for i in range(10):
+        scenarios.add(f"offer_{i}", prepayment_frame() if i % 2 else None, interest_rate=1.5 + 0.2 * i, bank_fees=500 * i)
+    return {'scenarios_10_offers': (scenarios.run, 20, 1)}
+
+
+def archive_cases():
+    import tempfile
+    from BatchPipeline import schedule_batches
+    from ScheduleArchive import ScheduleArchive, ScheduleArchiveWriter
+    loans = loan_frame(1000)
+    portfolio = MortgagePortfolio(**loans.to_dict('series'))
+    loan_ids, schedules = next(schedule_batches(np.arange(len(loans)), portfolio, len(loans)))
+    path = tempfile.mkdtemp(prefix='schedule-archive-')
+
+    def write():
+        writer = ScheduleArchiveWriter(path)
+        writer.write(loan_ids, schedules)
+        writer.close()
+    write()
+    archive = ScheduleArchive(path)
+    # Open plus one loan sliced out of the memory-mapped files
+    return {
+        'archive_write_1000': (write, 10, 1),
+        'archive_read_loan': ((lambda: ScheduleArchive(path).frame(loan_ids[500])), 50, 1),
+        'archive_slice_loan': ((lambda: archive.loan(loan_ids[500])), 200, 1),
+    }
+
+
+def stress_cases():
+    from StressTest import StressTest
+    loans = loan_frame(100000)
+    loans['monthly_income'] = loans['house_price'] / 60
+
+    def stress():
+        stress_test = StressTest()
+        stress_test.update(stress_test.evaluate(loans))
+        return stress_test.summary()
+    return {'stress_100k_loans_8_shocks': (stress, 3, 1)}
+
+
+# Modules on the numbers-only path and the heavy packages they must not load at import
+LAZY_IMPORTS = {
+    'MortgageClass': ('pandas', 'plotly', 'matplotlib'),
+    'PortfolioClass': ('pandas', 'plotly', 'matplotlib'),
+    'ParallelClass': ('pandas', 'plotly', 'matplotlib'),
+    'OptimizerClass': ('pandas', 'plotly', 'matplotlib'),
+    'SimulationClass': ('pandas', 'plotly', 'matplotlib'),
+    'ScenarioClass': ('pandas', 'plotly', 'matplotlib'),
+    'AffordabilitySolver': ('pandas', 'plotly', 'matplotlib'),
+    'StressTest': ('pandas', 'plotly', 'matplotlib'),
+    'ScheduleArchive': ('pandas', 'plotly', 'matplotlib'),
+    'BackgroundClass': ('pandas', 'plotly', 'matplotlib'),
+    'GraphicClass': ('plotly', 'pandas', 'matplotlib'),
+}
+
+
+def _import_in_subprocess(module):
+    """Import `module` in a fresh interpreter; return the heavy modules it loaded."""
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    loaded = json.loads(output)
+    return [name for name in LAZY_IMPORTS[module] if name in loaded]
+
+
+def check_lazy_imports():
+    """Return {module: [heavy packages loaded at import]} for the modules that break the guard."""
+    violations = {module: _import_in_subprocess(module) for module in LAZY_IMPORTS}
+    return {module: loaded for module, loaded in violations.items() if loaded}
+
+
+def import_cases():
+    # Cold start: interpreter startup plus the import, in a fresh process each time
+    cases = {'import_numpy': ((lambda: subprocess.run([sys.executable, '-c', 'import numpy'], check=True)), 5, 1)}
+    for module in ('MortgageClass', 'PortfolioClass', 'GraphicClass'):
+        cases[f"import_{module}"] = ((lambda module=module: _import_in_subprocess(module)), 5, 1)
+    return cases
+
+
+BENCHMARKS = {'calculator': calculator_cases, 'batch': batch_cases, 'affordability': affordability_cases, 'figure': figure_cases,
+              'kernel': kernel_cases, 'scenario': scenario_cases, 'stress': stress_cases,
+              'archive': archive_cases, 'parallel': parallel_cases, 'imports': import_cases}
+
+
+def run_benchmarks(groups=None, pattern=None, repeat_scale=1.0, verbose=True):
+    """Run the benchmark groups and return a JSON-serializable result document."""
+    results = {}
+    for group in groups or BENCHMARKS:
+        for name, (func, repeat, number) in BENCHMARKS[group]().items():
+            if pattern and pattern not in name:
+                continue
+            result = measure(func, max(3, int(repeat * repeat_scale)), number)
+            if name.startswith('batch_'):
+                result['rows_per_second'] = int(name.split('_')[1]) / result['median_ms'] * 1000
+            serial = name.replace('_parallel', '_serial')
+            if name.endswith('_parallel') and serial in results:
+                result['workers'] = os.cpu_count()
+                result['speedup'] = results[serial]['median_ms'] / result['median_ms']
+            results[name] = result
+            if verbose:
+                speedup = f", x{result['speedup']:.2f} on {result['workers']} cores" if 'speedup' in result else ''
+                print(f"{name:<32} {result['median_ms']:>10.3f} ms (min {result['min_ms']:.3f}){speedup}", file=sys.stderr)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.10):
+    """Compare two result documents; return rows (name, baseline ms, current ms, ratio, regressed)."""
+    rows = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['median_ms']
+        ratio = result['median_ms'] / before if before else float('inf')
+        rows.append((name, before, result['median_ms'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the calculator, APR, schedule, batch and chart paths.")
+    parser.add_argument('--output', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file; exit with status 1 if a benchmark regresses")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Allowed slowdown before a regression is reported (0.10 = 10%%)")
+    parser.add_argument('--groups', nargs='+', choices=list(BENCHMARKS), help="Benchmark groups to run (default: all)")
+    parser.add_argument('--filter', help="Only run benchmarks whose name contains this string")
+    parser.add_argument('--repeat-scale', type=float, default=1.0, help="Scale the number of samples per benchmark")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.groups, args.filter, args.repeat_scale)
+    status = 0
+    if 'imports' in (args.groups or BENCHMARKS):
+        current['import_violations'] = check_lazy_imports()
+        for module, loaded in current['import_violations'].items():
+            print(f"import {module} loads {', '.join(loaded)}  REGRESSION")
+            status = 1
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        rows = compare(baseline, current, args.threshold)
+        for name, before, after, ratio, regressed in rows:
+            print(f"{name:<32} {before:>10.3f} -> {after:>10.3f} ms  x{ratio:.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def scenario_key(*values, digits=6):
+    """Normalize scenario inputs into a hashable key (425000 and 425000.0 give the same key)."""
+    key = []
+    for value in values:
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            value = round(float(value), digits)
+        key.append(value)
+    return tuple(key)
+
+
+def file_digest(data):
+    """Content hash of an uploaded file (bytes), or None when there is no file."""
+    if data is None:
+        return None
+    return hashlib.sha256(data).hexdigest()
+
+
+def estimate_size(value):
+    """Rough memory footprint in bytes of a cached calculator, figure or array."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(estimate_size(item) for item in value.values())
+    if hasattr(value, 'schedule'):
+        return value.schedule.nbytes + 4096
+    if hasattr(value, 'data') and hasattr(value, 'layout'):
+        points = sum(len(trace[axis]) for trace in value.data for axis in ('x', 'y') if trace[axis] is not None)
+        return points * 16 + 16384
+    return sys.getsizeof(value)
+
+
+class ScenarioCache:
+    """Thread-safe LRU cache for computed scenarios, bounded by entry count and memory."""
+
+    def __init__(self, max_entries=128, max_bytes=256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, compute, sizeof=estimate_size):
+        """Return the cached value for `key`, calling `compute()` on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        size = sizeof(value)
+
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
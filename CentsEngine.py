@@ -0,0 +1,261 @@
+import numpy as np
+from AmortizationEngine import TYPE_TERM, TYPE_FEE, _new_schedule, _state
+from AprSolver import annuity_payment, annuity_periods
+from ProfilerClass import count
+
+ROUNDING_MODES = ('half_even', 'half_up')
+
+# Annual rates are held as integers in units of 1e-8 (1.8 % -> 1_800_000), so monthly
+# interest is an exact integer division: balance_cents * rate_units / (12 * RATE_SCALE)
+RATE_SCALE = 10**8
+
+# Monthly interest bound (in cents) below which float64 arithmetic on whole cents is exact
+FLOAT_INTEREST_LIMIT = 2**20
+
+
+def _check_rounding(rounding):
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"Unknown rounding '{rounding}', expected one of {list(ROUNDING_MODES)}.")
+
+
+def round_cents(values, rounding='half_even'):
+    """Euro amounts to int64 cents (array) using the given rounding mode."""
+    _check_rounding(rounding)
+    # Strip binary representation noise (1500.005 * 100 = 150000.49999...) before rounding
+    cents = np.round(np.asarray(values, dtype=np.float64) * 100, 6)
+    if rounding == 'half_even':
+        return np.rint(cents).astype(np.int64)
+    return (np.sign(cents) * np.floor(np.abs(cents) + 0.5)).astype(np.int64)
+
+
+def rate_units(monthly_rate):
+    """Monthly rate (fraction) as an integer annual rate in 1/RATE_SCALE units."""
+    return np.rint(np.asarray(monthly_rate, dtype=np.float64) * 12 * RATE_SCALE).astype(np.int64)
+
+
+def _divide(numerator, denominator, rounding):
+    """Rounded integer division of non-negative int64 arrays."""
+    quotient, remainder = np.divmod(numerator, denominator)
+    twice = 2 * remainder
+    if rounding == 'half_even':
+        up = (twice > denominator) | ((twice == denominator) & (quotient % 2 == 1))
+    else:
+        up = twice >= denominator
+    return quotient + up
+
+
+def _divide_int(numerator, denominator, half_even):
+    """Scalar `_divide` on Python ints."""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and (not half_even or quotient % 2 == 1)):
+        quotient += 1
+    return quotient
+
+
+def _payment_cents(rate, months, balance_cents, rounding):
+    """Level payment in cents to repay `balance_cents` over `months` at annual `rate` units."""
+    return round_cents(annuity_payment(rate / (12 * RATE_SCALE), months, balance_cents / 100), rounding)
+
+
+def cents_schedule(debt, monthly_rate, months, extra_amounts=None, extra_types=None, rounding='half_even'):
+    """Amortization schedule with balances tracked in exact int64 cents.
+
+    Interest is rounded to the cent every month, the payment is rounded once when it is
+    set, and the last installment absorbs the accumulated rounding so the loan ends at
+    exactly zero. Amounts in the schedule are whole cents.
+    """
+    _check_rounding(rounding)
+    months = int(months)
+    debt = int(round_cents(debt, rounding)) / 100
+    if extra_amounts is not None:
+        extra_amounts = round_cents(extra_amounts, rounding) / 100
+    schedule = _new_schedule(debt, monthly_rate, months, extra_amounts, extra_types)
+    schedule.rounding = rounding
+    rate = int(rate_units(monthly_rate))
+    schedule.initial_state['monthly_payment'] = int(_payment_cents(rate, months, round(debt * 100), rounding)) / 100
+    return schedule, resume_cents_schedule(schedule, 1)
+
+
+def resume_cents_schedule(schedule, month, state=None):
+    """Recompute a cents schedule from `month` to the end and return the final state."""
+    if state is None:
+        state = schedule.state_at(month)
+    rounding = schedule.rounding
+    half_even = rounding == 'half_even'
+    rate = int(rate_units(schedule.monthly_rate))
+    denominator = 12 * RATE_SCALE
+    months = len(schedule.payment_number)
+    extra_cents = round_cents(schedule.extra_amounts, rounding).tolist()
+    extra_types = schedule.extra_types.tolist()
+
+    # Python ints: exact, and faster than numpy scalars in a sequential loop
+    monthly_payment = round(state['monthly_payment'] * 100)
+    remaining_months = state['remaining_months']
+    remaining_balance = round(state['remaining_balance'] * 100)
+    total_interest_paid = round(state['total_interest_paid'] * 100)
+    first_month = month
+    rows = []
+
+    while month <= months and remaining_balance > 0:
+        extra_payment = extra_cents[month - 1]
+        interest_payment = _divide_int(remaining_balance * rate, denominator, half_even)
+        regular_debt = monthly_payment - interest_payment
+        debt_payment = regular_debt + extra_payment
+
+        if remaining_balance <= debt_payment or remaining_months <= 1:
+            # Final installment: pay off the balance, including the rounding residue
+            extra_payment = min(extra_payment, remaining_balance)
+            regular_debt = remaining_balance - extra_payment
+            debt_payment = remaining_balance
+            total_payment = debt_payment + interest_payment
+            remaining_balance = 0
+            remaining_months = 0
+        else:
+            total_payment = monthly_payment + extra_payment
+            remaining_balance -= debt_payment
+            if extra_payment == 0:
+                remaining_months -= 1
+            elif extra_types[month - 1] == TYPE_TERM:
+                remaining_months = int(annuity_periods(rate / denominator, monthly_payment / 100, remaining_balance / 100) + 0.5)
+            elif extra_types[month - 1] == TYPE_FEE:
+                remaining_months -= 1
+                monthly_payment = int(_payment_cents(rate, remaining_months, remaining_balance, rounding))
+        total_interest_paid += interest_payment
+
+        rows.append((monthly_payment, total_payment, regular_debt, extra_payment, debt_payment,
+                     interest_payment, remaining_balance, total_interest_paid, remaining_months))
+        month += 1
+
+    if rows:
+        seg = slice(first_month - 1, month - 1)
+        values = np.array(rows, dtype=np.int64).T
+        for field, column in zip(('monthly_payment', 'total_payment', 'regular_amortization', 'additional_amortization',
+                                  'total_amortization', 'interest', 'remaining_balance', 'accrued_interest'), values[:8]):
+            getattr(schedule, field)[seg] = column / 100
+        schedule.remaining_months[seg] = values[8]
+
+    schedule.truncate(month - 1)
+    count('schedule.months_computed', month - first_month)
+    schedule.final_state = _state(monthly_payment / 100, remaining_months, remaining_balance / 100, total_interest_paid / 100)
+    return schedule.final_state
+
+
+def _float_interest(balance, rate, rounding, out):
+    """Rounded monthly interest in cents, on float64 arrays holding whole cents.
+
+    Exact while balance * rate < FLOAT_INTEREST_LIMIT * 12 * RATE_SCALE: the product is an exact
+    integer and the quotient is off by less than half the distance from a rounding boundary.
+    """
+    np.multiply(balance, rate, out=out)
+    out /= 12 * RATE_SCALE
+    if rounding == 'half_even':
+        return np.rint(out, out=out)
+    out += 0.5
+    return np.floor(out, out=out)
+
+
+def _float_last_balance(balance, rate, payment, steps, rounding):
+    """Balance after `steps` regular months, for loans whose balance only decreases, as float64 cents."""
+    # Longest runs first, so the loans still running at a month are a prefix of the arrays
+    order = np.argsort(-steps, kind='stable')
+    balance = balance[order].astype(np.float64)
+    rate = rate[order].astype(np.float64)
+    payment = payment[order].astype(np.float64)
+    steps = steps[order]
+    running = np.searchsorted(-steps, -np.arange(1, steps[0] + 1 if len(order) else 1), side='right')
+
+    interest = np.empty_like(balance)
+    for n in running:
+        current = balance[:n]
+        change = _float_interest(current, rate[:n], rounding, interest[:n])
+        change -= payment[:n]
+        current += change
+
+    result = np.empty_like(balance)
+    result[order] = balance
+    return result
+
+
+def _exact_summary(balance, rate, payment, months, rounding):
+    """Month-by-month int64 loop of `cents_summary`: (total interest, last payment, payments)."""
+    denominator = 12 * RATE_SCALE
+    order = np.argsort(-months, kind='stable')
+    balance = balance[order]
+    rate = rate[order]
+    payment = payment[order]
+    sorted_months = months[order]
+    running = np.searchsorted(-sorted_months, -np.arange(1, sorted_months[0] + 2 if len(order) else 1), side='right')
+
+    total_interest = np.zeros_like(balance)
+    last_payment = np.zeros_like(balance)
+    payments = np.zeros_like(balance)
+    for month in range(1, len(running)):
+        n, ending = running[month - 1], running[month]
+        current = balance[:n]
+        interest = _divide(current * rate[:n], denominator, rounding)
+        # A repaid balance stays at zero: no interest, no principal
+        principal = np.minimum(payment[:n] - interest, current)
+        # Loans in their last month pay off the balance, including the rounding residue
+        principal[ending:] = current[ending:]
+        payments[:n] += current > 0
+        last_payment[:n] = np.where(current > 0, principal + interest, last_payment[:n])
+        total_interest[:n] += interest
+        current -= principal
+
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    return total_interest[inverse], last_payment[inverse], payments[inverse]
+
+
+def cents_summary(debt, monthly_rate, months, rounding='half_even'):
+    """Exact-cents totals for many loans without extra payments, vectorized over loans.
+
+    Inputs broadcast against each other. Returns a dict of arrays of the broadcast shape: the
+    rounded monthly payment, the last installment (which absorbs the rounding residue), total
+    interest and the number of payments, in euros.
+
+    Every month depends on the previous rounded balance, so the months are stepped one by one;
+    each step is a few float64 operations on whole cents, which are exact in the range checked
+    by `_float_interest`. Loans outside that range, or that could repay early, take the int64 loop.
+    """
+    _check_rounding(rounding)
+    balance, months, monthly_rate = np.broadcast_arrays(
+        round_cents(debt, rounding), np.asarray(months).astype(np.int64), np.asarray(monthly_rate, dtype=np.float64))
+    shape = balance.shape
+    balance, months = balance.ravel(), months.ravel()
+    rate = rate_units(monthly_rate.ravel())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payment = round_cents(np.nan_to_num(annuity_payment(monthly_rate.ravel(), months, balance / 100)), rounding)
+
+    total_interest = np.zeros_like(balance)
+    last_payment = np.zeros_like(balance)
+    payments = np.zeros_like(balance)
+
+    # Payment above the first interest: the balance decreases every month, so it stays in range
+    # and a positive balance before the last month means no early repayment
+    with np.errstate(over='ignore', invalid='ignore'):
+        in_range = balance.astype(np.float64) * rate < FLOAT_INTEREST_LIMIT * 12 * RATE_SCALE
+    fast = (balance > 0) & (months >= 1) & (rate >= 0) & in_range
+    fast[fast] = payment[fast] > _float_interest(balance[fast].astype(np.float64), rate[fast], rounding, np.empty(fast.sum()))
+    index = np.flatnonzero(fast)
+    remaining = _float_last_balance(balance[index], rate[index], payment[index], months[index] - 1, rounding)
+    done = remaining > 0
+    index, remaining = index[done], remaining[done]
+    last_payment[index] = remaining + _float_interest(remaining, rate[index], rounding, np.empty(len(index)))
+    total_interest[index] = (months[index] - 1) * payment[index] + last_payment[index] - balance[index]
+    payments[index] = months[index]
+
+    exact = np.ones(len(balance), dtype=bool)
+    exact[index] = False
+    exact = np.flatnonzero(exact)
+    if len(exact):
+        total_interest[exact], last_payment[exact], payments[exact] = _exact_summary(
+            balance[exact], rate[exact], payment[exact], months[exact], rounding)
+
+    return {
+        'monthly_payment': (payment / 100).reshape(shape),
+        'last_payment': (last_payment / 100).reshape(shape),
+        'total_interest_paid': (total_interest / 100).reshape(shape),
+        'payments': payments.reshape(shape),
+    }
@@ -1,15 +1,104 @@
-import plotly.io as pio
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import numpy as np
+from ProfilerClass import timed
+
+# Plotly is imported inside the methods, so importing this module stays cheap
+
+# Aggregation -> months per point
+AGGREGATIONS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+# Theme colors of the app, for charts rendered outside Streamlit (reports, notebooks)
+DEFAULT_PARAMS = {
+    'color_bg': "#616161",
+    'color_box': "#e0e0e0",
+    'color_line': "#FFFFFF",
+    'color_text': "#FFFFFF",
+    'color_text_third': "#202020",
+}
+
+PAYMENT_FIELDS = [
+    ('interest', 'Interest'),
+    ('regular_amortization', 'Regular Amortization'),
+    ('additional_amortization', 'Additional Amortization'),
+]
+
+
+def lttb(x, y, n_out):
+    """Indices of the Largest-Triangle-Three-Buckets downsampling of (x, y) to `n_out` points."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket boundaries over the inner points; first and last points are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(area.argmax())
+        indices[bucket + 1] = previous
+    return indices
+
+
+def downsample(x, columns, aggregation='yearly', how='sample', max_points=1000):
+    """Reduce schedule column arrays for plotting.
+
+    `aggregation` is 'monthly', 'quarterly', 'yearly' or 'lttb'. Periods either keep their
+    first month (`how='sample'`, the original yearly view) or are summed / averaged. 'lttb'
+    keeps the `max_points` months that best preserve the shape of the summed columns.
+    Returns (x, {name: values}).
+    """
+    x = np.asarray(x)
+    if aggregation == 'lttb':
+        index = lttb(x, np.sum([columns[name] for name in columns], axis=0), max_points)
+        return x[index], {name: np.asarray(values)[index] for name, values in columns.items()}
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{aggregation}', expected one of {list(AGGREGATIONS) + ['lttb']}.")
+
+    step = AGGREGATIONS[aggregation]
+    if how == 'sample' or step == 1:
+        return x[::step], {name: np.asarray(values)[::step] for name, values in columns.items()}
+    if how not in ('sum', 'mean'):
+        raise ValueError(f"Unknown aggregation method '{how}', expected 'sample', 'sum' or 'mean'.")
+    starts = np.arange(0, len(x), step)
+    reduced = {name: np.add.reduceat(np.asarray(values, dtype=np.float64), starts) for name, values in columns.items()}
+    if how == 'mean':
+        counts = np.diff(np.append(starts, len(x)))
+        reduced = {name: values / counts for name, values in reduced.items()}
+    return x[starts], reduced
+
 
 class GraphicClass:
-    def __init__(self, mortgage, mortgage_enhanced, params):
-        self.mortgage = mortgage
-        self.mortgage_enhanced = mortgage_enhanced
-        self.params = params
+    """Charts of one or more mortgages (MortgageCalculator or ScenarioSet scenarios) sharing one theme."""
+
+    def __init__(self, mortgages=(), params=None, names=None, aggregation='yearly', how='sample', max_points=1000, webgl_threshold=1000):
+        self.set_mortgages(mortgages, names)
+        self.params = DEFAULT_PARAMS if params is None else params
+        self.aggregation = aggregation
+        self.how = how
+        self.max_points = max_points
+        # Points per trace above which WebGL traces replace SVG bars
+        self.webgl_threshold = webgl_threshold
+        self._figures = {}
         self.set_streamlit_theme()
 
+    def set_mortgages(self, mortgages, names=None):
+        """Point the charts at new results; existing figures are updated in place on the next call."""
+        self.mortgages = list(mortgages)
+        if names is None:
+            names = [getattr(mortgage, 'name', f"Scenario {i + 1}") for i, mortgage in enumerate(self.mortgages)]
+        self.names = list(names)
+
     def set_streamlit_theme(self):
+        import plotly.io as pio
+        import plotly.graph_objects as go
         pio.templates["Streamlit"] = go.layout.Template(
             layout=go.Layout(
                 font=dict(size=16, color=self.params['color_text']),
@@ -46,76 +135,39 @@ class GraphicClass:
 
         pio.templates.default = "Streamlit"
 
-    def monthly_payment_graph(self):
-        data = self.mortgage.get_amortization_schedule().iloc[::12]
-        data_enhanced = self.mortgage_enhanced.get_amortization_schedule().iloc[::12]
-        color_box = self.params['color_box']
-        
-        
-        fig = make_subplots(rows=2, cols=1, 
-                            shared_xaxes=True,
-                            vertical_spacing=0.05,
-                            )
-
-        # Plot 1
-        fig.add_trace(go.Bar(
-            x=data['Payment Number'],
-            y=data['Interest'],
-            name='Interest',
-            showlegend=True),
-            row=1,
-            col=1
-            )
-
-        fig.add_trace(go.Bar(
-            x=data['Payment Number'],
-            y=data['Regular Amortization'],
-            name='Regular Amortization',
-            showlegend=True),
-            row=1,
-            col=1
-            )
-
-        fig.add_trace(go.Bar(
-            x=data['Payment Number'],
-            y=data['Additional Amortization'],
-            name='Additional Amortization',
-            showlegend=True),
-            row=1,
-            col=1
-        )
+    def _check_mortgages(self):
+        if not self.mortgages:
+            raise ValueError("At least one mortgage is required.")
 
-        # Plot 2
-        fig.add_trace(go.Bar(
-            x=data_enhanced['Payment Number'],
-            y=data_enhanced['Interest'],
-            name='Interest',
-            showlegend=False),
-            row=2,
-            col=1
-            )
+    def payment_columns(self, mortgage):
+        """Downsampled payment number and payment breakdown arrays, straight from the schedule columns."""
+        schedule = mortgage.schedule
+        columns = {field: schedule.column(field) for field, _ in PAYMENT_FIELDS}
+        columns['total_payment'] = schedule.column('total_payment')
+        return downsample(schedule.column('payment_number'), columns, self.aggregation, self.how, self.max_points)
 
-        fig.add_trace(go.Bar(
-            x=data_enhanced['Payment Number'],
-            y=data_enhanced['Regular Amortization'],
-            name='Regular Amortization',
-            showlegend=False),
-            row=2,
-            col=1
-            )
+    def _payment_skeleton(self, webgl, n_rows):
+        """Subplots (one per mortgage), traces and layout of the payment chart, without data."""
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
 
-        fig.add_trace(go.Bar(
-            x=data_enhanced['Payment Number'],
-            y=data_enhanced['Additional Amortization'],
-            name='Additional Amortization',
-            showlegend=False),
-            row=2,
-            col=1
-        )
+        fig = make_subplots(rows=n_rows, cols=1,
+                            shared_xaxes=True,
+                            vertical_spacing=0.05 if n_rows <= 2 else 0.1 / n_rows,
+                            )
+        for row in range(1, n_rows + 1):
+            for i, (_, name) in enumerate(PAYMENT_FIELDS):
+                if webgl:
+                    # Scattergl cannot stack, so traces carry cumulative sums and fill to the previous one
+                    trace = go.Scattergl(mode='lines', fill='tozeroy' if i == 0 else 'tonexty', line=dict(width=1),
+                                         hovertemplate='%{customdata:,.2f}', name=name, showlegend=row == 1)
+                else:
+                    trace = go.Bar(name=name, showlegend=row == 1)
+                fig.add_trace(trace, row=row, col=1)
 
         fig.update_layout(
             width=900,
-            height=600,
+            height=max(600, 250 * n_rows),
             barmode='stack',
             xaxis_title='',
             yaxis_title='',
@@ -129,7 +181,7 @@ class GraphicClass:
                 xanchor='center',
                 x=0.5,                  # centered horizontally
                 title_text='',          # no legend title
-                bgcolor=color_box,# transparent background (optional)
+                bgcolor=self.params['color_box'],# transparent background (optional)
                 font=dict(size=14, color='black')
             )
         )
@@ -144,11 +196,147 @@ class GraphicClass:
             xanchor='center',
             yanchor='middle'
         )
+        fig.update_xaxes(title_text='', row=1, col=1)
+        fig.update_xaxes(title_text='Month', row=n_rows, col=1)
+        return fig
+
+    @timed('monthly_payment_graph')
+    def monthly_payment_graph(self):
+        """Stacked payment breakdown, one panel per mortgage.
+
+        The figure skeleton is built once per trace kind and number of panels and reused;
+        later calls only replace the trace data and axis ranges.
+        """
+        self._check_mortgages()
+        panels = [self.payment_columns(mortgage) for mortgage in self.mortgages]
+        webgl = max(len(x) for x, _ in panels) > self.webgl_threshold
+        kind = ('webgl' if webgl else 'bar', len(panels))
+        if kind not in self._figures:
+            self._figures[kind] = self._payment_skeleton(webgl, len(panels))
+        fig = self._figures[kind]
+
+        y_max = max(columns['total_payment'].max() for _, columns in panels) * 1.1
+        x_max = max(mortgage.loan_term_years for mortgage in self.mortgages) * 12
+        with fig.batch_update():
+            for row, (x, columns) in enumerate(panels):
+                stacked = 0
+                for i, (field, _) in enumerate(PAYMENT_FIELDS):
+                    trace = fig.data[row * len(PAYMENT_FIELDS) + i]
+                    trace.x = x
+                    if webgl:
+                        stacked = stacked + columns[field]
+                        trace.y = stacked
+                        trace.customdata = columns[field]
+                    else:
+                        trace.y = columns[field]
+            for row in range(1, len(panels) + 1):
+                fig.update_xaxes(range=[-10, x_max], row=row, col=1)
+                fig.update_yaxes(range=[-10, y_max], row=row, col=1, title_text=self.names[row - 1] if len(panels) > 2 else None)
+        return fig
+
+    def balance_graph(self):
+        """Remaining balance of every mortgage over one month axis; repaid loans stay at zero."""
+        self._check_mortgages()
+        length = max(len(mortgage.schedule) for mortgage in self.mortgages)
+        series = {}
+        for name, mortgage in zip(self.names, self.mortgages):
+            balance = np.zeros(length)
+            values = mortgage.schedule.column('remaining_balance')
+            balance[:len(values)] = values
+            series[name] = balance
+        return self.overlay_graph(np.arange(1, length + 1), series, 'Remaining Balance', 'Balance (€)', key='balance')
+
+    @timed('scenario_diff_graph')
+    def scenario_diff_graph(self, diff, metric='lifetime_cost', title=None):
+        """Bars of one metric of every scenario minus the baseline, from `ScenarioSet.diff`."""
+        import plotly.graph_objects as go
+
+        values = np.asarray(diff[metric])
+        fig = self._figures.get(('diff', len(values)))
+        if fig is None:
+            fig = go.Figure(go.Bar(hovertemplate='%{x}: %{y:,.2f}<extra></extra>'))
+            fig.update_layout(width=900, height=400, xaxis_title='', yaxis_title='Difference to baseline')
+            self._figures[('diff', len(values))] = fig
+
+        with fig.batch_update():
+            fig.data[0].x = self.names
+            fig.data[0].y = values
+            # Cheaper than the baseline in green, dearer in red
+            fig.data[0].marker.color = np.where(values > 0, "#EC6161", "#3ECAAC")
+            fig.update_layout(title_text=title or metric.replace('_', ' ').capitalize())
+        return fig
+
+    @timed('overlay_graph')
+    def overlay_graph(self, x, series, title='', y_title='', key='overlay'):
+        """Many line series over one x axis (percentile fans, sweeps), downsampled, WebGL past the threshold.
+
+        `series` maps trace names to y arrays. The figure for `key` is reused while the
+        trace names and the trace kind stay the same.
+        """
+        import plotly.graph_objects as go
+
+        x, series = downsample(x, series, self.aggregation, self.how, self.max_points)
+        webgl = len(x) * len(series) > self.webgl_threshold
+        signature = (key, webgl, tuple(series))
+        fig = self._figures.get(signature)
+        if fig is None:
+            trace_type = go.Scattergl if webgl else go.Scatter
+            fig = go.Figure([trace_type(mode='lines', name=name) for name in series])
+            fig.update_layout(width=900, height=500, xaxis_title='Month', yaxis_title=y_title)
+            self._figures[signature] = fig
 
-        fig.update_xaxes(title_text='', range=[-10, self.mortgage.loan_term_years * 12], row=1, col=1)
-        fig.update_yaxes(range=[-10, data_enhanced['Total Payment'].max() * 1.1], row=1, col=1)
+        with fig.batch_update():
+            for trace, values in zip(fig.data, series.values()):
+                trace.x = x
+                trace.y = values
+            fig.update_layout(title_text=title)
+        return fig
+
+    @timed('stress_graph')
+    def stress_graph(self, summary):
+        """Payment increase and payment-to-income breaches per shock, from a StressTest summary frame."""
+        import plotly.graph_objects as go
+        from plotly.subplots import make_subplots
+
+        shocks = summary['shock'].tolist()
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                            subplot_titles=('Monthly payment increase (€)', 'Payment-to-income breaches (%)'))
+        fig.add_trace(go.Bar(x=shocks, y=summary['mean_payment_delta'], name='Mean'), row=1, col=1)
+        fig.add_trace(go.Scatter(x=shocks, y=summary['p95_payment_delta'], name='95th percentile', mode='markers',
+                                 marker=dict(size=12, symbol='diamond')), row=1, col=1)
+        fig.add_trace(go.Bar(x=shocks, y=summary['pti_breach_rate'] * 100, name='Breach rate', showlegend=False), row=2, col=1)
+        fig.update_layout(width=900, height=700, barmode='group', title_text=f"Stress test of {int(summary['loans'].max()):,} loans")
+        return fig
+
+    @timed('sensitivity_heatmap')
+    def sensitivity_heatmap(self, grid, metric='monthly_payment', cash=None):
+        """Heatmap of a sensitivity grid metric over interest rate and term, at the closest cash value."""
+        import plotly.graph_objects as go
+        if cash is None:
+            cash = self.mortgages[0].cash
+        cash_index = int(abs(grid['cash'] - cash).argmin())
+        titles = {
+            'monthly_payment': 'Monthly Payment (€)',
+            'total_interest_paid': 'Total Interest (€)',
+            'apr': 'APR (%)',
+        }
+
+        fig = go.Figure(go.Heatmap(
+            x=grid['loan_term_years'],
+            y=grid['interest_rate'],
+            z=grid[metric][:, :, cash_index],
+            colorscale='RdBu_r',
+            colorbar=dict(title=dict(text=titles.get(metric, metric))),
+            hovertemplate='Term: %{x} years<br>Rate: %{y:.2f} %<br>%{z:,.2f}<extra></extra>',
+            )
+        )
+
+        fig.update_layout(
+            width=900,
+            height=600,
+            title_text=f"{titles.get(metric, metric)} with {grid['cash'][cash_index]:,.0f} € cash",
+            xaxis_title='Loan Term (years)',
+            yaxis_title='Interest Rate (%)',
+        )
 
-        fig.update_xaxes(title_text='Month', range=[-10, self.mortgage.loan_term_years * 12], row=2, col=1)
-        fig.update_yaxes(range=[-10, data_enhanced['Total Payment'].max() * 1.1], row=2, col=1)
-        
         return fig
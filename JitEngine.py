@@ -0,0 +1,172 @@
+import math
+import numpy as np
+from AmortizationEngine import TYPE_TERM, TYPE_FEE, amortization_schedule, _new_schedule, _state
+from ScheduleClass import FLOAT_FIELDS
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # Without Numba the kernels stay plain Python; callers use the NumPy engine instead
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+N_FIELDS = len(FLOAT_FIELDS)
+
+# Without Numba, the month loop in plain Python still beats the NumPy engine once
+# roughly one month in twelve has an extra payment (each one ends a closed-form segment)
+DENSE_EXTRA_SHARE = 1 / 12
+
+
+@njit(cache=True, error_model='numpy')
+def _payment(monthly_rate, months, balance):
+    """AprSolver.annuity_payment for scalars."""
+    growth = (1 + monthly_rate) ** months
+    factor = months if monthly_rate == 0 else (growth - 1) / monthly_rate
+    if factor == 0:
+        # NumPy semantics for a zero term, also when running without Numba
+        return math.nan if balance == 0 else math.copysign(math.inf, balance)
+    return balance * growth / factor
+
+
+@njit(cache=True, error_model='numpy')
+def _periods(monthly_rate, monthly_payment, balance):
+    """AprSolver.annuity_periods for scalars."""
+    payment = -monthly_payment
+    if monthly_rate == 0:
+        return balance / payment
+    level = payment / monthly_rate
+    return math.log(level / (balance + level)) / math.log(1 + monthly_rate)
+
+
+@njit(cache=True, error_model='numpy')
+def _schedule_kernel(debt, monthly_rate, months, extra_amounts, extra_types, rows, remaining_rows, write):
+    """The month loop of `amortization_schedule_loop` over typed arrays.
+
+    Fills `rows` (N_FIELDS x months, in FLOAT_FIELDS order) and `remaining_rows` when `write` is set and
+    returns (months filled, payment, remaining months, balance, total interest).
+    """
+    monthly_payment = _payment(monthly_rate, months, debt)
+    remaining_months = months
+    remaining_balance = debt
+    total_interest_paid = 0.0
+    count = 0
+
+    for i in range(months):
+        extra_payment = extra_amounts[i]
+        interest_payment = remaining_balance * monthly_rate
+        regular_debt = monthly_payment - interest_payment
+        debt_payment = monthly_payment - interest_payment + extra_payment
+
+        # Prevent over payment
+        if remaining_balance - debt_payment < 0.01:
+            debt_payment = remaining_balance
+            actual_payment = debt_payment + interest_payment
+        else:
+            actual_payment = monthly_payment
+
+        total_interest_paid += interest_payment
+        remaining_balance = max(0.0, remaining_balance - debt_payment)
+
+        if extra_payment != 0:
+            if extra_types[i] == TYPE_TERM:
+                remaining_months = int(_periods(monthly_rate, monthly_payment, remaining_balance) + 0.5)
+            elif extra_types[i] == TYPE_FEE:
+                remaining_months -= 1
+                monthly_payment = _payment(monthly_rate, remaining_months, remaining_balance)
+        else:
+            remaining_months -= 1
+
+        if write:
+            rows[0, i] = monthly_payment
+            rows[1, i] = actual_payment + extra_payment
+            rows[2, i] = regular_debt
+            rows[3, i] = extra_payment
+            rows[4, i] = debt_payment
+            rows[5, i] = interest_payment
+            rows[6, i] = remaining_balance
+            rows[7, i] = total_interest_paid
+            remaining_rows[i] = remaining_months
+        count = i + 1
+
+        if remaining_balance <= 0.01 or remaining_months <= 0:
+            break
+
+    return count, monthly_payment, remaining_months, remaining_balance, total_interest_paid
+
+
+@njit(cache=True, error_model='numpy')
+def _batch_kernel(debt, monthly_rate, months, extra_amounts, extra_types, out):
+    no_rows = np.empty((N_FIELDS, 0))
+    no_remaining = np.empty(0, dtype=np.int32)
+    for loan in range(len(debt)):
+        n = months[loan]
+        count, monthly_payment, remaining_months, remaining_balance, total_interest_paid = _schedule_kernel(
+            debt[loan], monthly_rate[loan], n, extra_amounts[loan, :n], extra_types[loan, :n], no_rows, no_remaining, False)
+        out[0, loan] = monthly_payment
+        out[1, loan] = remaining_months
+        out[2, loan] = remaining_balance
+        out[3, loan] = total_interest_paid
+        out[4, loan] = count
+
+
+def _use_kernel(extra_amounts, months):
+    if extra_amounts is None:
+        # Without extra payments the closed-form NumPy engine is already fast
+        return False
+    return NUMBA_AVAILABLE or np.count_nonzero(extra_amounts) >= DENSE_EXTRA_SHARE * months
+
+
+def compiled_schedule(debt, monthly_rate, months, extra_amounts=None, extra_types=None):
+    """Same result as `amortization_schedule`, from the month-loop kernel when it is the faster path.
+
+    The kernel is JIT-compiled when Numba is installed; otherwise it only runs (as plain
+    Python) for dense extra payments, and sparse ones go to the NumPy engine.
+    """
+    months = int(months)
+    if not _use_kernel(extra_amounts, months):
+        return amortization_schedule(debt, monthly_rate, months, extra_amounts, extra_types)
+
+    schedule = _new_schedule(debt, monthly_rate, months, extra_amounts, extra_types)
+    count, monthly_payment, remaining_months, remaining_balance, total_interest_paid = _schedule_kernel(
+        float(debt), float(monthly_rate), months, schedule.extra_amounts, schedule.extra_types,
+        schedule._data, schedule.remaining_months, True)
+    schedule.truncate(count)
+    schedule.final_state = _state(monthly_payment, remaining_months, remaining_balance, total_interest_paid)
+    return schedule, schedule.final_state
+
+
+def batch_schedule_summary(debt, monthly_rate, months, extra_amounts, extra_types):
+    """Final state of many schedules with extra payments, without keeping their rows.
+
+    `extra_amounts` and `extra_types` are (loans, max months) arrays. Returns a dict of
+    arrays: monthly_payment, remaining_months, remaining_balance, total_interest_paid and
+    months_paid. One compiled loop over all loans when Numba is installed, else per-loan
+    `compiled_schedule`.
+    """
+    debt, monthly_rate, months = np.broadcast_arrays(
+        np.asarray(debt, dtype=np.float64), np.asarray(monthly_rate, dtype=np.float64), np.asarray(months).astype(np.int64))
+    extra_amounts = np.ascontiguousarray(extra_amounts, dtype=np.float64)
+    extra_types = np.ascontiguousarray(extra_types, dtype=np.int8)
+    out = np.empty((5, len(debt)))
+
+    if NUMBA_AVAILABLE:
+        _batch_kernel(debt, monthly_rate, months, extra_amounts, extra_types, out)
+    else:
+        for loan in range(len(debt)):
+            n = int(months[loan])
+            schedule, state = compiled_schedule(debt[loan], monthly_rate[loan], n, extra_amounts[loan, :n], extra_types[loan, :n])
+            out[:4, loan] = state['monthly_payment'], state['remaining_months'], state['remaining_balance'], state['total_interest_paid']
+            out[4, loan] = len(schedule)
+
+    return {
+        'monthly_payment': out[0],
+        'remaining_months': out[1].astype(np.int64),
+        'remaining_balance': out[2],
+        'total_interest_paid': out[3],
+        'months_paid': out[4].astype(np.int64),
+    }
@@ -1,11 +1,14 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import numpy_financial  as npf
 import os
+from AmortizationEngine import prepayment_plan
+from PrepaymentClass import PrepaymentPlan
+from JitEngine import compiled_schedule
+from AprSolver import annuity_payment, annuity_rate, annual_percentage_rate, cash_flow_rate
+from CentsEngine import cents_schedule, round_cents
+from ProfilerClass import stage
 
 class MortgageCalculator:
-    def __init__(self, house_price, cash, interest_rate, loan_term_years, cost=0, taxes=6, bank_fees=0, bank_fees_monthly=0, amortization_schedule_path=None, amortization_schedule_df=None):
+    def __init__(self, house_price, cash, interest_rate, loan_term_years, cost=0, taxes=6, bank_fees=0, bank_fees_monthly=0, amortization_schedule_path=None, amortization_schedule_df=None, rounding=None):
         self.house_price = house_price
         self.cash = cash
         self.interest_rate = interest_rate / 100
@@ -21,6 +24,8 @@ class MortgageCalculator:
         self.debt = self.taxes_cost_fees + self.house_price - self.down_payment
         self.amortization_schedule_path = amortization_schedule_path
         self.amortization_schedule_df = amortization_schedule_df
+        # None keeps float balances; 'half_even' or 'half_up' tracks exact cents
+        self.rounding = rounding
         self.initial_monthly_payment = self.calculate_mortgage_payment()
         
         if self.down_payment > self.house_price:
@@ -28,101 +33,94 @@ class MortgageCalculator:
         
     def calculate_apr(self):
         monthly_flow = self.initial_monthly_payment + self.bank_fees_monthly
-        cash_flows = [-self.debt] + [monthly_flow] * self.loan_term_months
-        monthly_irr = npf.irr(cash_flows)
-        self.apr = ((1 + monthly_irr) ** 12 - 1) * 100
+        monthly_irr = annuity_rate(self.debt, monthly_flow, self.loan_term_months, guess=self.monthly_rate)
+        self.apr = float(annual_percentage_rate(monthly_irr))
         return self.apr
+
+    def calculate_schedule_apr(self):
+        """APR from the payments actually made in the amortization schedule."""
+        if not hasattr(self, 'schedule'):
+            raise ValueError("Amortization schedule has not been created yet.")
+        payments = self.schedule.column('total_payment') + self.bank_fees_monthly
+        monthly_irr = cash_flow_rate(self.debt, payments, guess=self.monthly_rate)
+        self.schedule_apr = float(annual_percentage_rate(monthly_irr))
+        return self.schedule_apr
     
     def calculate_mortgage_payment(self):
-        self.monthly_payment = -npf.pmt(self.monthly_rate, self.loan_term_months, self.debt)
+        self.monthly_payment = annuity_payment(self.monthly_rate, self.loan_term_months, self.debt)
+        if self.rounding is not None:
+            self.monthly_payment = int(round_cents(self.monthly_payment, self.rounding)) / 100
         return self.monthly_payment
 
     def create_extra_amortization_schedule(self):
+        # pandas is only loaded when there is an extra amortization table to read
         if self.amortization_schedule_path is not None and os.path.exists(self.amortization_schedule_path):
+            import pandas as pd
             self.amortization_schedule = pd.read_csv(self.amortization_schedule_path, delimiter=';')
-        elif self.amortization_schedule_df is not None and isinstance(self.amortization_schedule_df, pd.DataFrame):
+        elif isinstance(self.amortization_schedule_df, PrepaymentPlan):
             self.amortization_schedule = self.amortization_schedule_df
+        elif self.amortization_schedule_df is not None:
+            import pandas as pd
+            self.amortization_schedule = self.amortization_schedule_df if isinstance(self.amortization_schedule_df, pd.DataFrame) else None
         else:
             self.amortization_schedule = None
+        # Validated, sorted and deduplicated once; None when there are no extra payments
+        self.prepayments = None
+        if self.amortization_schedule is not None:
+            self.prepayments = prepayment_plan(self.amortization_schedule, self.loan_term_months)
+            if not len(self.prepayments):
+                self.prepayments = None
     
     def create_amortization_schedule(self):
         """Create a mathematically correct amortization schedule."""
-        self.remaining_months = self.loan_term_months
-        self.monthly_payment = -npf.pmt(self.monthly_rate, self.remaining_months, self.debt)
-        self.schedule_data = []
-        self.remaining_balance = self.debt
-        self.total_interest_paid = 0
-    
-        for month in range(1, self.loan_term_months + 1):
-            extra_payment = 0
-            amort_type = None
-
-            if self.amortization_schedule is not None:
-                amort_type = self.amortization_schedule.loc[month - 1, 'Type']
-                extra_payment = self.amortization_schedule.loc[month - 1, 'Amortization']
-
-            self.interest_payment = self.remaining_balance * self.monthly_rate
-            self.regular_debt = self.monthly_payment - self.interest_payment
-            self.debt_payment = self.monthly_payment - self.interest_payment + extra_payment
-            
-            # Prevent over payment (if the remaining balance is less than the debt payment)
-            if self.remaining_balance - self.debt_payment < 0.01:
-                self.debt_payment = self.remaining_balance
-                actual_payment = self.debt_payment + self.interest_payment
-            else:
-                actual_payment = self.monthly_payment
-
-            self.total_interest_paid += self.interest_payment
-            self.remaining_balance -= self.debt_payment
-            self.remaining_balance = max(0, self.remaining_balance)
+        extra_amounts, extra_types = None, None
+        if self.prepayments is not None:
+            extra_amounts, extra_types = self.prepayments.dense(self.loan_term_months)
 
-            if extra_payment != 0:
-                if amort_type == 'Term':
-                    self.remaining_months = int(npf.nper(self.monthly_rate, -self.monthly_payment, self.remaining_balance) + 0.5)
+        if self.rounding is not None:
+            self.schedule, state = cents_schedule(self.debt, self.monthly_rate, self.loan_term_months, extra_amounts, extra_types, self.rounding)
+        else:
+            self.schedule, state = compiled_schedule(self.debt, self.monthly_rate, self.loan_term_months, extra_amounts, extra_types)
+        self.set_schedule_state(state)
 
-                elif amort_type == 'Fee':
-                    self.remaining_months -= 1
-                    self.monthly_payment = -npf.pmt(self.monthly_rate, self.remaining_months, self.remaining_balance)
-            else:
-                self.remaining_months -= 1
+    def set_schedule_state(self, state):
+        self.monthly_payment = state['monthly_payment']
+        self.remaining_months = state['remaining_months']
+        self.remaining_balance = state['remaining_balance']
+        self.total_interest_paid = state['total_interest_paid']
 
-            self.schedule_data.append({
-                'Payment Number': month,
-                'Monthly Payment': round(self.monthly_payment, 2),
-                'Total Payment': round(actual_payment + extra_payment, 2),
-                'Regular Amortization': round(self.regular_debt, 2),
-                'Additional Amortization': round(extra_payment, 2),
-                'Total Amortization': round(self.debt_payment, 2),
-                'Amortization Type': amort_type,
-                'Interest': round(self.interest_payment, 2),
-                'Remaining Balance': round(max(0, self.remaining_balance), 2),
-                
-                'Accrued Interest': round(self.total_interest_paid, 2),
-                'Remaining Months': self.remaining_months,
-                'Remaining Balance (after payment)': round(max(0, self.remaining_balance), 2),
-                'Amortization Type': extra_payment
-            })
+    def edit_extra_payment(self, month, amount, amort_type=None):
+        """Change the extra payment of one month, recomputing the schedule from that month only."""
+        if not hasattr(self, 'schedule'):
+            raise ValueError("Amortization schedule has not been created yet.")
+        self.set_schedule_state(self.schedule.apply_edit(month, amount, amort_type))
 
-            if self.remaining_balance <= 0.01 or self.remaining_months <= 0:
-                break
-            
     def get_amortization_schedule(self):
         """Return the amortization schedule as a DataFrame."""
-        if not hasattr(self, 'schedule_data'):
+        if not hasattr(self, 'schedule'):
             raise ValueError("Amortization schedule has not been created yet.")
-        return pd.DataFrame(self.schedule_data)
+        with stage('get_amortization_schedule'):
+            return self.schedule.to_frame()
             
     def run(self):
-        self.calculate_mortgage_payment()
-        self.create_extra_amortization_schedule()
-        self.create_amortization_schedule()
-        self.calculate_apr()
+        with stage('MortgageCalculator.run'):
+            with stage('calculate_mortgage_payment'):
+                self.calculate_mortgage_payment()
+            with stage('create_extra_amortization_schedule'):
+                self.create_extra_amortization_schedule()
+            with stage('create_amortization_schedule'):
+                self.create_amortization_schedule()
+            with stage('calculate_apr'):
+                self.calculate_apr()
+        self.calculate_totals()
+        # self.amortization_schedule = self.schedule.to_frame()
+        # self.amortization_schedule.to_csv(self.amortization_schedule_path, index=False)
+
+    def calculate_totals(self):
         self.total_mortgage = self.house_price + self.taxes_cost_fees - self.down_payment
         self.total_cost = self.house_price + self.taxes_cost_fees
         self.total_paid = self.debt + self.cash
         self.financing_percentage = self.total_mortgage / self.total_cost * 100
-        # self.amortization_schedule = pd.DataFrame(self.schedule_data)
-        # self.amortization_schedule.to_csv(self.amortization_schedule_path, index=False)
 
 if __name__ == "__main__":
     params = {
@@ -0,0 +1,123 @@
+import numpy as np
+from AmortizationEngine import amortization_summary, amortization_schedule, TYPE_CODES, TYPE_TERM
+
+OBJECTIVES = {
+    # Minimize total interest paid
+    'interest': lambda summary, months: summary['total_interest_paid'],
+    # Minimize the average regular payment over the original term, keeping the term (so 'Fee' payments
+    # only). The final payment alone would reward late lump sums that only lower the last few installments.
+    'payment': lambda summary, months: summary['regular_paid'] / months if summary['months_paid'] >= months else np.inf,
+}
+
+
+class PrepaymentOptimizer:
+    """Greedy search for the extra amortization plan that makes the best use of a prepayment budget.
+
+    The budget is a lump sum available from month 1, a monthly surplus that accumulates,
+    or both, optionally limited per loan year. Each step spends `increment` euros on the
+    (month, type) with the largest gain, evaluated with `amortization_summary`. The 'payment'
+    objective keeps the original term, so it only considers 'Fee' payments.
+    """
+
+    def __init__(self, mortgage, budget=0, monthly_surplus=0, yearly_cap=None, objective='interest', increment=1000, candidate_step=12, types=('Term', 'Fee')):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {list(OBJECTIVES)}.")
+        self.debt = mortgage.debt
+        self.monthly_rate = mortgage.monthly_rate
+        self.loan_term_months = int(mortgage.loan_term_months)
+        self.budget = budget
+        self.monthly_surplus = monthly_surplus
+        self.yearly_cap = yearly_cap
+        self.objective = objective
+        self.increment = increment
+        self.candidate_step = candidate_step
+        self.types = [TYPE_CODES[amort_type] for amort_type in types]
+        if objective == 'payment':
+            self.types = [amort_type for amort_type in self.types if amort_type != TYPE_TERM]
+        if not self.types:
+            raise ValueError(f"Objective '{objective}' needs at least one 'Fee' amortization type.")
+
+    def evaluate(self, plan):
+        """Summary of the schedule for a plan {month: (amount, type code)}."""
+        events = [(month, amount, amort_type) for month, (amount, amort_type) in plan.items()]
+        summary = amortization_summary(self.debt, self.monthly_rate, self.loan_term_months, events)
+        # Everything paid back is debt plus interest; what the extra payments do not cover is regular payments
+        summary['regular_paid'] = self.debt + summary['total_interest_paid'] - sum(amount for amount, _ in plan.values())
+        return summary
+
+    def payments(self, plan=None):
+        """Regular monthly payment of each month under a plan (default: the optimized plan)."""
+        plan = self.plan if plan is None else plan
+        amounts = np.zeros(self.loan_term_months)
+        types = np.zeros(self.loan_term_months, dtype=np.int8)
+        for month, (amount, amort_type) in plan.items():
+            amounts[month - 1] = amount
+            types[month - 1] = amort_type
+        schedule, _ = amortization_schedule(self.debt, self.monthly_rate, self.loan_term_months, amounts, types)
+        return np.array(schedule.column('monthly_payment'))
+
+    def early_payment_reduction(self, months=None):
+        """Mean payment saved over the first `months` months (default: half the term) versus no prepayments."""
+        months = self.loan_term_months // 2 if months is None else int(months)
+        return float(np.mean(self.payments({})[:months]) - np.mean(self.payments()[:months]))
+
+    def run(self):
+        months = self.loan_term_months
+        score = OBJECTIVES[self.objective]
+        available = self.budget + self.monthly_surplus * np.arange(1, months + 1)
+        spent = np.zeros(months)
+        candidates = [(month, amort_type) for month in range(1, months + 1, self.candidate_step) for amort_type in self.types]
+
+        self.plan = {}
+        summary = self.evaluate(self.plan)
+        current = score(summary, months)
+        while True:
+            # Money left at each month if nothing else is spent later on
+            slack = available - np.cumsum(spent)
+            slack = np.minimum.accumulate(slack[::-1])[::-1]
+
+            best = None
+            for month, amort_type in candidates:
+                if month > summary['months_paid'] or slack[month - 1] < self.increment:
+                    continue
+                if self.plan.get(month, (0, amort_type))[1] != amort_type:
+                    continue
+                year_start = (month - 1) // 12 * 12
+                if self.yearly_cap is not None and spent[year_start:year_start + 12].sum() + self.increment > self.yearly_cap:
+                    continue
+
+                trial = dict(self.plan)
+                trial[month] = (trial.get(month, (0, amort_type))[0] + self.increment, amort_type)
+                trial_summary = self.evaluate(trial)
+                value = score(trial_summary, months)
+                if best is None or value < best[0]:
+                    best = (value, month, trial, trial_summary)
+
+            if best is None or not best[0] < current - 1e-9:
+                break
+            current, month, self.plan, summary = best
+            spent[month - 1] += self.increment
+
+        self.summary = summary
+        self.summary['early_payment_reduction'] = self.early_payment_reduction()
+        return self.to_frame()
+
+    def to_frame(self):
+        """Plan in the extra amortization CSV layout (Month, Amortization, Type), one row per month."""
+        if not hasattr(self, 'plan'):
+            raise ValueError("Optimizer has not been run yet.")
+        import pandas as pd
+        names = {code: name for name, code in TYPE_CODES.items()}
+        amounts = np.zeros(self.loan_term_months)
+        types = [np.nan] * self.loan_term_months
+        for month, (amount, amort_type) in self.plan.items():
+            amounts[month - 1] = amount
+            types[month - 1] = names[amort_type]
+        return pd.DataFrame({
+            'Month': np.arange(1, self.loan_term_months + 1),
+            'Amortization': np.round(amounts, 2),
+            'Type': types,
+        })
+
+    def to_csv(self, path):
+        self.to_frame().to_csv(path, sep=';', index=False)
@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from JitEngine import batch_schedule_summary
+
+SUMMARY_FIELDS = ['monthly_payment', 'remaining_months', 'remaining_balance', 'total_interest_paid', 'months_paid']
+
+
+def _create(shape, dtype):
+    """New shared memory block and an array over it."""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _attach(name, shape, dtype=np.float64):
+    """Attach to an existing shared memory block as an array."""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _summarize_chunk(loans_name, amounts_name, types_name, output_name, n_loans, width, start, stop):
+    """Worker task: schedule summaries of loans [start, stop) from the shared inputs into the shared outputs."""
+    shms, (loans, amounts, types, outputs) = zip(
+        _attach(loans_name, (3, n_loans)), _attach(amounts_name, (n_loans, width)),
+        _attach(types_name, (n_loans, width), np.int8), _attach(output_name, (len(SUMMARY_FIELDS), n_loans)))
+    try:
+        debt, monthly_rate, months = loans[:, start:stop]
+        final = batch_schedule_summary(debt, monthly_rate, months.astype(np.int64), amounts[start:stop], types[start:stop])
+        for i, field in enumerate(SUMMARY_FIELDS):
+            outputs[i, start:stop] = final[field]
+    finally:
+        del loans, amounts, types, outputs
+        for shm in shms:
+            shm.close()
+    return stop - start
+
+
+class ParallelExecutor:
+    """Run per-loan schedules with extra payments across a pool of worker processes.
+
+    Only the month-by-month prepayment path is worth a process: closed-form pricing
+    (PortfolioClass.calculate_batch) is faster than the cost of shipping loans to workers.
+    Inputs and results live in shared memory, so tasks only carry the block names and a
+    row range; results are written in place and keep the input order.
+    """
+
+    def __init__(self, workers=None, chunk_size=2000):
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def schedule_summary(self, debt, monthly_rate, months, extra_amounts, extra_types):
+        """Final state of many schedules, like JitEngine.batch_schedule_summary, computed chunk by chunk in the pool."""
+        debt, monthly_rate, months = np.broadcast_arrays(
+            np.asarray(debt, dtype=np.float64), np.asarray(monthly_rate, dtype=np.float64), np.asarray(months).astype(np.int64))
+        extra_amounts = np.asarray(extra_amounts, dtype=np.float64)
+        if extra_amounts.shape[0] != len(debt) or np.shape(extra_types) != extra_amounts.shape:
+            raise ValueError("Extra payments need one row per loan, with amounts and types of the same shape.")
+        n_loans, width = extra_amounts.shape
+
+        shms, (loans, amounts, types, outputs) = zip(
+            _create((3, n_loans), np.float64), _create((n_loans, width), np.float64),
+            _create((n_loans, width), np.int8), _create((len(SUMMARY_FIELDS), n_loans), np.float64))
+        try:
+            loans[:] = debt, monthly_rate, months
+            amounts[:] = extra_amounts
+            types[:] = extra_types
+
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            futures = [self._pool.submit(_summarize_chunk, *[shm.name for shm in shms], n_loans, width, start, min(start + self.chunk_size, n_loans))
+                       for start in range(0, n_loans, self.chunk_size)]
+            for future in futures:
+                future.result()
+            results = {field: outputs[i].copy() for i, field in enumerate(SUMMARY_FIELDS)}
+        finally:
+            del loans, amounts, types, outputs
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+        for field in ('remaining_months', 'months_paid'):
+            results[field] = results[field].astype(np.int64)
+        return results
+
+
+def schedule_summary_parallel(debt, monthly_rate, months, extra_amounts, extra_types, workers=None, chunk_size=2000):
+    """One-off parallel schedule summaries of many loans with extra payments."""
+    with ParallelExecutor(workers, chunk_size) as executor:
+        return executor.schedule_summary(debt, monthly_rate, months, extra_amounts, extra_types)
@@ -0,0 +1,126 @@
+import numpy as np
+from AprSolver import annuity_payment, annuity_rate, annual_percentage_rate
+from CentsEngine import cents_summary, round_cents
+
+PORTFOLIO_COLUMNS = {
+    'house_price': None,
+    'cash': None,
+    'interest_rate': None,
+    'loan_term_years': None,
+    'cost': 0,
+    'taxes': 6,
+    'bank_fees': 0,
+    'bank_fees_monthly': 0,
+}
+
+
+class MortgagePortfolio:
+    """Many mortgages priced at once, one array element per loan."""
+
+    def __init__(self, house_price, cash, interest_rate, loan_term_years, cost=0, taxes=6, bank_fees=0, bank_fees_monthly=0, validate=True, rounding=None):
+        (self.house_price, self.cash, self.interest_rate, self.loan_term_years,
+         self.cost, self.taxes, self.bank_fees, self.bank_fees_monthly) = np.broadcast_arrays(
+            *[np.asarray(value, dtype=np.float64) for value in
+              (house_price, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)])
+        self.interest_rate = self.interest_rate / 100
+        self.monthly_rate = self.interest_rate / 12
+        self.loan_term_months = self.loan_term_years * 12
+        self.taxes_cost_fees = (self.taxes / 100) * self.house_price + self.cost + self.bank_fees
+        self.down_payment = self.cash - self.taxes_cost_fees
+        self.debt = self.taxes_cost_fees + self.house_price - self.down_payment
+        self.rounding = rounding
+
+        # Loans failing validation are reported as NaN when validate is False
+        self.valid = self.down_payment <= self.house_price
+        invalid = np.flatnonzero(~self.valid)
+        if validate and invalid.size:
+            raise ValueError(f"Down payment cannot be greater than house price (rows {invalid[:10].tolist()}).")
+
+    def __len__(self):
+        return self.house_price.size
+
+    def calculate_mortgage_payment(self):
+        self.monthly_payment = annuity_payment(self.monthly_rate, self.loan_term_months, self.debt)
+        if self.rounding is not None:
+            self.monthly_payment = round_cents(self.monthly_payment, self.rounding) / 100
+        return self.monthly_payment
+
+    def calculate_apr(self):
+        monthly_flow = self.monthly_payment + self.bank_fees_monthly
+        monthly_irr = annuity_rate(self.debt, monthly_flow, self.loan_term_months, guess=self.monthly_rate)
+        self.apr = annual_percentage_rate(monthly_irr)
+        return self.apr
+
+    def run(self):
+        self.calculate_mortgage_payment()
+        self.calculate_apr()
+        if self.rounding is not None:
+            # Month-by-month in int64 cents, vectorized over the loans
+            valid_debt = np.where(self.valid, self.debt, 0)
+            self.total_interest_paid = cents_summary(valid_debt, self.monthly_rate, self.loan_term_months, self.rounding)['total_interest_paid']
+        else:
+            self.total_interest_paid = self.monthly_payment * self.loan_term_months - self.debt
+        self.total_mortgage = self.house_price + self.taxes_cost_fees - self.down_payment
+        self.total_cost = self.house_price + self.taxes_cost_fees
+        self.total_paid = self.debt + self.cash
+        self.financing_percentage = self.total_mortgage / self.total_cost * 100
+
+    def results(self):
+        """Return the summary metrics as a dict of arrays."""
+        results = {
+            'monthly_payment': self.monthly_payment,
+            'apr': self.apr,
+            'total_interest_paid': self.total_interest_paid,
+            'financing_percentage': self.financing_percentage,
+            'down_payment': self.down_payment,
+        }
+        return {name: np.where(self.valid, values, np.nan) for name, values in results.items()}
+
+
+def portfolio_from_frame(df, validate=True):
+    """Build a MortgagePortfolio from a DataFrame with one loan per row; optional columns take the defaults."""
+    missing = [column for column, default in PORTFOLIO_COLUMNS.items() if default is None and column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    inputs = {column: df[column].to_numpy() if column in df.columns else default
+              for column, default in PORTFOLIO_COLUMNS.items()}
+    return MortgagePortfolio(**inputs, validate=validate)
+
+
+def calculate_batch(df):
+    """Price every row of a DataFrame (one loan per row) and return a dict of result arrays."""
+    portfolio = portfolio_from_frame(df)
+    portfolio.run()
+    return portfolio.results()
+
+
+def grid_axis(param):
+    """Values of a streamlit_params.yaml range (min, max, step), inclusive."""
+    count = int(round((param['max'] - param['min']) / param['step'])) + 1
+    return param['min'] + param['step'] * np.arange(count)
+
+
+def sensitivity_grid(house_price, interest_rates, loan_term_years, cash, cost=0, taxes=6, bank_fees=0, bank_fees_monthly=0):
+    """Evaluate every interest rate x term x cash combination in one broadcast computation.
+
+    Result arrays have shape (len(interest_rates), len(loan_term_years), len(cash)); combinations
+    where the down payment exceeds the house price are NaN.
+    """
+    interest_rates = np.asarray(interest_rates, dtype=np.float64)
+    loan_term_years = np.asarray(loan_term_years, dtype=np.float64)
+    cash = np.asarray(cash, dtype=np.float64)
+    portfolio = MortgagePortfolio(
+        house_price,
+        cash[np.newaxis, np.newaxis, :],
+        interest_rates[:, np.newaxis, np.newaxis],
+        loan_term_years[np.newaxis, :, np.newaxis],
+        cost, taxes, bank_fees, bank_fees_monthly,
+        validate=False,
+    )
+    portfolio.run()
+    grid = portfolio.results()
+    grid['interest_rate'] = interest_rates
+    grid['loan_term_years'] = loan_term_years
+    grid['cash'] = cash
+    return grid
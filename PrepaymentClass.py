@@ -0,0 +1,148 @@
+import numpy as np
+
+# Same codes as AmortizationEngine (which imports this module)
+TYPE_NONE = 0
+TYPE_TERM = 1
+TYPE_FEE = 2
+TYPE_CODES = {'Term': TYPE_TERM, 'Fee': TYPE_FEE}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+# Rows quoted in a validation error before the rest are only counted
+MAX_REPORTED_ERRORS = 5
+
+
+class PrepaymentPlan:
+    """Sparse extra amortization plan: sorted unique months (1-based), amounts and type codes as arrays.
+
+    Only months with a payment are stored, so an empty plan costs nothing and the engines
+    jump straight from one event to the next.
+    """
+
+    def __init__(self, months=(), amounts=(), types=()):
+        self.months = np.asarray(months, dtype=np.int64)
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.types = np.asarray(types, dtype=np.int8)
+        if not len(self.months) == len(self.amounts) == len(self.types):
+            raise ValueError("Prepayment months, amounts and types must have the same length.")
+        if len(self.months) and (np.any(np.diff(self.months) <= 0) or self.months[0] < 1):
+            raise ValueError("Prepayment months must be sorted, unique and start at month 1 or later.")
+
+    def __len__(self):
+        return len(self.months)
+
+    def __repr__(self):
+        return f"PrepaymentPlan({len(self)} payments, {self.amounts.sum():,.2f} total)"
+
+    @classmethod
+    def from_frame(cls, df, months=None):
+        """Validate, sort and dedupe an extra amortization table (Month, Amortization, Type) in one pass.
+
+        Rows with a zero or empty amount are skipped, as are months after `months` (the loan
+        term). The month comes from the `Month` column, or from the row index when there is
+        none. Payments in the same month are added up. Bad rows raise a ValueError naming
+        the rows and the reason.
+        """
+        import pandas as pd
+
+        # Header cells may carry a byte order mark or stray spaces from spreadsheet exports
+        columns = {str(column).lstrip('\ufeff').strip(): column for column in df.columns}
+        if 'Amortization' not in columns:
+            raise ValueError("Extra amortization table needs an 'Amortization' column.")
+
+        raw_amounts = df[columns['Amortization']]
+        amounts = pd.to_numeric(raw_amounts, errors='coerce').to_numpy(dtype=np.float64, copy=True)
+        if 'Month' in columns:
+            raw_months = df[columns['Month']]
+            month_values = pd.to_numeric(raw_months, errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            raw_months = pd.Series(df.index)
+            month_values = pd.to_numeric(raw_months, errors='coerce').to_numpy(dtype=np.float64) + 1
+        if 'Type' in columns:
+            names = df[columns['Type']].astype('string').str.strip()
+        else:
+            names = pd.Series(pd.NA, index=df.index, dtype='string')
+        types = names.map(TYPE_CODES).fillna(TYPE_NONE).to_numpy(dtype=np.int8)
+
+        empty_amount = raw_amounts.isna().to_numpy()
+        amounts[empty_amount] = 0
+        active = amounts != 0
+
+        checks = [
+            (np.isnan(amounts), lambda i: f"amount '{raw_amounts.iloc[i]}' is not a number"),
+            (amounts < 0, lambda i: f"amount {amounts[i]:g} is negative"),
+            (active & ~np.isfinite(month_values), lambda i: f"month '{raw_months.iloc[i]}' is not a number"),
+            (active & np.isfinite(month_values) & (month_values != np.round(month_values)),
+             lambda i: f"month {month_values[i]:g} is not a whole month"),
+            (active & (month_values < 1), lambda i: f"month {month_values[i]:g} is before the first payment"),
+            (active & (types == TYPE_NONE),
+             lambda i: "type is missing" if pd.isna(names.iloc[i]) else f"type '{names.iloc[i]}' is not one of {list(TYPE_CODES)}"),
+        ]
+        bad = np.zeros(len(df), dtype=bool)
+        for mask, _ in checks:
+            bad |= mask
+        if bad.any():
+            rows = np.flatnonzero(bad)
+            messages = []
+            for i in rows[:MAX_REPORTED_ERRORS]:
+                reasons = [describe(i) for mask, describe in checks if mask[i]]
+                messages.append(f"row {i + 1}: {', '.join(reasons)}")
+            more = f" (and {len(rows) - MAX_REPORTED_ERRORS} more)" if len(rows) > MAX_REPORTED_ERRORS else ""
+            raise ValueError(f"Invalid extra amortization rows: {'; '.join(messages)}{more}.")
+
+        keep = active & ((month_values <= months) if months is not None else True)
+        return cls.from_arrays(month_values[keep].astype(np.int64), amounts[keep], types[keep])
+
+    @classmethod
+    def from_csv(cls, path_or_buffer, months=None, delimiter=';'):
+        import pandas as pd
+        return cls.from_frame(pd.read_csv(path_or_buffer, delimiter=delimiter), months)
+
+    @classmethod
+    def from_arrays(cls, months, amounts, types):
+        """Sort valid (month, amount, type code) arrays and merge payments of the same month."""
+        months = np.asarray(months, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        types = np.asarray(types, dtype=np.int8)
+        if not len(months):
+            return cls()
+        order = np.argsort(months, kind='stable')
+        months, amounts, types = months[order], amounts[order], types[order]
+        unique_months, starts = np.unique(months, return_index=True)
+        conflict = np.minimum.reduceat(types, starts) != np.maximum.reduceat(types, starts)
+        if conflict.any():
+            raise ValueError(f"Extra amortization months with both Term and Fee payments: "
+                             f"{', '.join(str(month) for month in unique_months[conflict][:MAX_REPORTED_ERRORS])}.")
+        return cls(unique_months, np.add.reduceat(amounts, starts), types[starts])
+
+    @classmethod
+    def from_dense(cls, extra_amounts, extra_types):
+        """Plan from per-month arrays (index 0 is month 1), as stored in an AmortizationSchedule."""
+        months = np.flatnonzero(extra_amounts)
+        return cls(months + 1, np.asarray(extra_amounts)[months], np.asarray(extra_types)[months])
+
+    def truncate(self, months):
+        """Plan without the payments after month `months`."""
+        keep = self.months <= months
+        return PrepaymentPlan(self.months[keep], self.amounts[keep], self.types[keep])
+
+    def dense(self, months):
+        """(amounts, type codes) arrays of length `months`, index 0 being month 1."""
+        months = int(months)
+        amounts = np.zeros(months, dtype=np.float64)
+        types = np.zeros(months, dtype=np.int8)
+        keep = self.months <= months
+        amounts[self.months[keep] - 1] = self.amounts[keep]
+        types[self.months[keep] - 1] = self.types[keep]
+        return amounts, types
+
+    def events(self):
+        """[(month, amount, type code)], the input of `amortization_summary`."""
+        return list(zip(self.months.tolist(), self.amounts.tolist(), self.types.tolist()))
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({
+            'Month': self.months,
+            'Amortization': self.amounts,
+            'Type': [TYPE_NAMES[code] for code in self.types.tolist()],
+        })
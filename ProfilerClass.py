@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from collections import deque
+
+
+class _NullStage:
+    """Shared no-op context returned by `stage` while profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """Per-stage timers and counters, grouped into recordings (one per app rerun or script run).
+
+    Finished recordings keep a {stage: ms} breakdown in `history`. Optionally every recording
+    is written as Chrome trace events (open in chrome://tracing or Perfetto) and/or profiled
+    with cProfile, dumped to `cprofile_path` (pstats format, cumulative over recordings).
+    """
+
+    def __init__(self, trace_path=None, cprofile_path=None, history=20):
+        self.trace_path = trace_path
+        self.cprofile_path = cprofile_path
+        self.history = deque(maxlen=history)
+        self.totals = {}
+        self.counters = {}
+        self._events = deque(maxlen=history * 256)
+        self._recording = None
+        self._origin = time.perf_counter()
+        self._cprofile = None
+        if cprofile_path:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add(self, name, start, stop):
+        elapsed = stop - start
+        with self._lock:
+            count, seconds = self.totals.get(name, (0, 0.0))
+            self.totals[name] = (count + 1, seconds + elapsed)
+            if self._recording is not None:
+                breakdown = self._recording['stages']
+                breakdown[name] = breakdown.get(name, 0.0) + elapsed * 1000
+            if self.trace_path:
+                self._events.append({
+                    'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                    'ts': (start - self._origin) * 1e6, 'dur': elapsed * 1e6,
+                })
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+            if self._recording is not None:
+                counters = self._recording['counters']
+                counters[name] = counters.get(name, 0) + n
+
+    def begin(self, label):
+        """Start a recording; stages timed until `end` are attributed to it."""
+        self._recording = {'label': label, 'start': time.perf_counter(), 'stages': {}, 'counters': {}}
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def end(self):
+        """Finish the current recording, store its breakdown and write the trace files."""
+        recording, self._recording = self._recording, None
+        if recording is None:
+            return None
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+        stop = time.perf_counter()
+        self.add(recording['label'], recording['start'], stop)
+        breakdown = {
+            'label': recording['label'],
+            'time': time.strftime('%H:%M:%S'),
+            'total_ms': (stop - recording['start']) * 1000,
+            'stages': recording['stages'],
+            'counters': recording['counters'],
+        }
+        self.history.append(breakdown)
+        if self.trace_path:
+            self.write_chrome_trace(self.trace_path)
+        return breakdown
+
+    def record(self, label):
+        return _Recording(self, label)
+
+    def write_chrome_trace(self, path):
+        with self._lock:
+            events = list(self._events)
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def summary(self):
+        """Total calls and milliseconds per stage since the profiler was enabled."""
+        return {name: {'calls': count, 'total_ms': seconds * 1000, 'mean_ms': seconds * 1000 / count}
+                for name, (count, seconds) in self.totals.items()}
+
+
+class _Recording:
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+
+    def __enter__(self):
+        self.profiler.begin(self.label)
+        return self
+
+    def __exit__(self, *exc):
+        self.breakdown = self.profiler.end()
+        return False
+
+
+_profiler = None
+# Profiler of the current session (thread or task), used instead of the process-wide one
+_session_profiler = contextvars.ContextVar('session_profiler', default=None)
+
+
+def enable(trace_path=None, cprofile_path=None, history=20):
+    """Turn instrumentation on (idempotent) and return the active Profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(trace_path, cprofile_path, history)
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def use(profiler):
+    """Profile the current context (e.g. one app session) with `profiler`; None falls back to the process-wide one.
+
+    Work handed to other threads inherits it when run in a copy of the context
+    (`contextvars.copy_context().run`).
+    """
+    _session_profiler.set(profiler)
+
+
+def get_profiler():
+    return _session_profiler.get() or _profiler
+
+
+def stage(name):
+    """Time a block: `with stage('name'): ...`. A shared no-op while profiling is disabled."""
+    profiler = get_profiler()
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name)
+
+
+def timed(name=None):
+    """Decorator version of `stage` for whole functions."""
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = get_profiler()
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.stage(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.count(name, n)
+
+
+def record(label):
+    """Group the stages of one run: `with record('rerun'): ...`. A no-op while disabled."""
+    profiler = get_profiler()
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.record(label)
+
+
+# Opt in from the environment, e.g. MORTGAGE_PROFILE=1 MORTGAGE_TRACE=trace.json streamlit run streamlit.py
+if os.environ.get('MORTGAGE_PROFILE') or os.environ.get('MORTGAGE_TRACE') or os.environ.get('MORTGAGE_CPROFILE'):
+    enable(os.environ.get('MORTGAGE_TRACE'), os.environ.get('MORTGAGE_CPROFILE'))
@@ -0,0 +1,350 @@
+import os
+import time
+import hashlib
+import sqlite3
+
+import numpy as np
+from PortfolioClass import PORTFOLIO_COLUMNS, MortgagePortfolio, portfolio_from_frame
+from ScheduleClass import FLOAT_FIELDS, INT_FIELDS, AmortizationSchedule
+from CentsEngine import round_cents
+
+SUMMARY_COLUMNS = ['monthly_payment', 'apr', 'total_interest_paid', 'financing_percentage', 'down_payment']
+
+DEFAULT_PATH = os.path.join('~', '.cache', 'mortgage-calculator', 'results.sqlite')
+
+# Bump when engine changes alter results, so older entries are never returned
+STORE_VERSION = 1
+
+ROUNDING_CODES = {None: 0, 'half_even': 1, 'half_up': 2}
+
+_SEEDS = (0x9E3779B97F4A7C15, 0xD1B54A32D192ED03)
+
+
+def _mix(h):
+    """splitmix64 finalizer on uint64 arrays."""
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def extra_payment_digest(extra_amounts, extra_types):
+    """Canonical 128-bit digest of an extra payment schedule; None when it has no payments."""
+    if extra_amounts is None:
+        return None
+    months = np.flatnonzero(extra_amounts)
+    if not months.size:
+        return None
+    payload = (months.astype(np.int64).tobytes()
+               + (np.round(np.asarray(extra_amounts, dtype=np.float64)[months], 6) + 0.0).tobytes()
+               + np.asarray(extra_types, dtype=np.int64)[months].tobytes())
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def scenario_hashes(inputs, extra_digests=None, rounding=None):
+    """128-bit content keys of loans, as two int64 arrays.
+
+    `inputs` is a sequence of the PORTFOLIO_COLUMNS arrays (interest rate in %). Values are
+    canonicalized to 6 decimals like `scenario_key`, so 425000 and 425000.0 hash alike.
+    `extra_digests` holds one `extra_payment_digest` (or None) per loan.
+    """
+    values = np.round(np.atleast_2d(np.asarray(inputs, dtype=np.float64)), 6) + 0.0
+    bits = np.ascontiguousarray(values).view(np.uint64)
+    n_loans = bits.shape[1]
+    salt = np.uint64(STORE_VERSION << 8 | ROUNDING_CODES[rounding])
+    keys = [np.full(n_loans, seed, dtype=np.uint64) ^ salt for seed in _SEEDS]
+
+    rows = list(bits)
+    if extra_digests is not None:
+        digests = np.frombuffer(b''.join(digest or bytes(16) for digest in extra_digests), dtype=np.uint64).reshape(-1, 2)
+        rows += [digests[:, 0], digests[:, 1]]
+    for row in rows:
+        keys[0] = _mix(keys[0] ^ row)
+        keys[1] = _mix(keys[1] + _mix(row ^ np.uint64(_SEEDS[0])))
+    return keys[0].view(np.int64), keys[1].view(np.int64)
+
+
+def _portfolio_inputs(portfolio):
+    """PORTFOLIO_COLUMNS arrays of a portfolio, interest rate in % as it was given."""
+    return [portfolio.interest_rate * 100 if column == 'interest_rate' else getattr(portfolio, column)
+            for column in PORTFOLIO_COLUMNS]
+
+
+def portfolio_hashes(portfolio, extra_digests=None):
+    return scenario_hashes(_portfolio_inputs(portfolio), extra_digests, portfolio.rounding)
+
+
+def mortgage_hash(mortgage):
+    """Key of a MortgageCalculator scenario, including its extra amortization table."""
+    mortgage.create_extra_amortization_schedule()
+    digest = None
+    if mortgage.prepayments is not None:
+        digest = extra_payment_digest(*mortgage.prepayments.dense(mortgage.loan_term_months))
+    k1, k2 = scenario_hashes([[value] for value in _portfolio_inputs(mortgage)], [digest], mortgage.rounding)
+    return int(k1[0]), int(k2[0])
+
+
+def _decode_schedule(blob):
+    """{field: array} of a schedule stored as float rows followed by int rows."""
+    length = len(blob) // (8 * len(FLOAT_FIELDS) + 4 * len(INT_FIELDS))
+    floats = np.frombuffer(blob, dtype=np.float64, count=len(FLOAT_FIELDS) * length).reshape(len(FLOAT_FIELDS), length)
+    ints = np.frombuffer(blob, dtype=np.int32, offset=floats.nbytes).reshape(len(INT_FIELDS), length)
+    columns = dict(zip(FLOAT_FIELDS, floats))
+    columns.update(zip(INT_FIELDS, ints))
+    return columns
+
+
+def schedule_from_columns(columns):
+    """AmortizationSchedule holding stored columns (for output only: no inputs or states to resume from)."""
+    schedule = AmortizationSchedule(len(columns['payment_number']))
+    for field, values in columns.items():
+        getattr(schedule, field)[:] = values
+    return schedule
+
+
+class ResultStore:
+    """Content-addressed SQLite store of loan summaries and schedules under a cache directory.
+
+    The database runs in WAL mode, so any number of processes can read while one writes.
+    Each process (and each unpickled copy in a worker) opens its own connection. When the
+    stored size exceeds `max_bytes`, the least recently read entries are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=2**30):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._connection = None
+        self._pid = None
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self.connection as connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS results (k1 INTEGER, k2 INTEGER, "
+                f"{', '.join(f'{column} REAL' for column in SUMMARY_COLUMNS)}, "
+                f"schedule BLOB, size INTEGER, accessed REAL, PRIMARY KEY (k1, k2)) WITHOUT ROWID")
+            connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            # Running totals, kept by triggers in the writing transaction so puts never scan the table
+            connection.execute("CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER)")
+            connection.execute("INSERT OR IGNORE INTO totals SELECT 'bytes', COALESCE(SUM(size), 0) FROM results")
+            connection.execute("INSERT OR IGNORE INTO totals SELECT 'entries', COUNT(*) FROM results")
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results BEGIN "
+                "UPDATE totals SET value = value + new.size WHERE name = 'bytes'; "
+                "UPDATE totals SET value = value + 1 WHERE name = 'entries'; END")
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results BEGIN "
+                "UPDATE totals SET value = value - old.size WHERE name = 'bytes'; "
+                "UPDATE totals SET value = value - 1 WHERE name = 'entries'; END")
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS results_resize AFTER UPDATE OF size ON results BEGIN "
+                "UPDATE totals SET value = value + new.size - old.size WHERE name = 'bytes'; END")
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_connection'] = None
+        return state
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _lookup(self, k1, k2, columns):
+        """Rows of `columns` for the given keys, as (positions found, rows)."""
+        connection = self.connection
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (i INTEGER PRIMARY KEY, k1 INTEGER, k2 INTEGER)")
+        with connection:
+            connection.execute("DELETE FROM lookup")
+            connection.executemany("INSERT INTO lookup VALUES (?, ?, ?)", zip(range(len(k1)), k1.tolist(), k2.tolist()))
+        rows = connection.execute(
+            f"SELECT lookup.i, {', '.join('results.' + column for column in columns)} FROM lookup "
+            f"JOIN results ON results.k1 = lookup.k1 AND results.k2 = lookup.k2").fetchall()
+        if rows:
+            # Refresh the eviction order, at most once a minute per entry
+            now = time.time()
+            with connection:
+                connection.execute(
+                    "UPDATE results SET accessed = ? WHERE accessed < ? AND (k1, k2) IN (SELECT k1, k2 FROM lookup)",
+                    (now, now - 60))
+        return np.array([row[0] for row in rows], dtype=np.int64), rows
+
+    def get_summaries(self, k1, k2):
+        """Return (found mask, {column: array}) for many keys; missing loans are NaN."""
+        k1, k2 = np.atleast_1d(k1), np.atleast_1d(k2)
+        positions, rows = self._lookup(k1, k2, SUMMARY_COLUMNS)
+        found = np.zeros(len(k1), dtype=bool)
+        found[positions] = True
+        summaries = {column: np.full(len(k1), np.nan) for column in SUMMARY_COLUMNS}
+        if rows:
+            # SQLite stores NaN as NULL, which comes back as None
+            values = np.array([row[1:] for row in rows], dtype=np.float64)
+            for i, column in enumerate(SUMMARY_COLUMNS):
+                summaries[column][positions] = values[:, i]
+        self.hits += int(found.sum())
+        self.misses += int((~found).sum())
+        return found, summaries
+
+    def put_summaries(self, k1, k2, summaries):
+        now = time.time()
+        rows = zip(np.atleast_1d(k1).tolist(), np.atleast_1d(k2).tolist(),
+                   *[np.atleast_1d(summaries[column]).tolist() for column in SUMMARY_COLUMNS])
+        with self.connection as connection:
+            connection.executemany(
+                f"INSERT INTO results (k1, k2, {', '.join(SUMMARY_COLUMNS)}, size, accessed) "
+                f"VALUES (?, ?, {', '.join('?' * len(SUMMARY_COLUMNS))}, {16 + 8 * len(SUMMARY_COLUMNS)}, {now}) "
+                f"ON CONFLICT (k1, k2) DO UPDATE SET "
+                + ', '.join(f"{column} = excluded.{column}" for column in SUMMARY_COLUMNS), [tuple(row) for row in rows])
+        self.evict()
+
+    def get_schedule(self, key):
+        """Return (summary {column: value}, schedule columns {field: array}) for one key, or None."""
+        row = self.connection.execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)}, schedule FROM results WHERE k1 = ? AND k2 = ?", key).fetchone()
+        if row is None or row[-1] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        with self.connection as connection:
+            connection.execute("UPDATE results SET accessed = ? WHERE k1 = ? AND k2 = ? AND accessed < ?", (now, *key, now - 60))
+        summary = {column: np.nan if value is None else value for column, value in zip(SUMMARY_COLUMNS, row)}
+        return summary, _decode_schedule(row[-1])
+
+    def get_schedules(self, k1, k2):
+        """Return {position: schedule columns} for the keys that have a stored schedule."""
+        k1, k2 = np.atleast_1d(k1), np.atleast_1d(k2)
+        positions, rows = self._lookup(k1, k2, ['schedule'])
+        schedules = {int(i): _decode_schedule(row[1]) for i, row in zip(positions, rows) if row[1] is not None}
+        self.hits += len(schedules)
+        self.misses += len(k1) - len(schedules)
+        return schedules
+
+    def put_schedule(self, key, summary, schedule):
+        """Store a summary {column: value} together with an AmortizationSchedule."""
+        self.put_schedules([key[0]], [key[1]], {column: [summary[column]] for column in SUMMARY_COLUMNS}, [schedule])
+
+    def put_schedules(self, k1, k2, summaries, schedules):
+        """Store many schedules in one transaction; `summaries` is {column: array}, one element per schedule."""
+        now = time.time()
+        rows = []
+        for i, schedule in enumerate(schedules):
+            length = len(schedule)
+            blob = schedule._data[:, :length].tobytes() + schedule._ints[:, :length].tobytes()
+            rows.append((int(k1[i]), int(k2[i]), *[float(summaries[column][i]) for column in SUMMARY_COLUMNS],
+                         blob, 16 + 8 * len(SUMMARY_COLUMNS) + len(blob), now))
+        with self.connection as connection:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete skips the totals trigger
+            connection.executemany(
+                f"INSERT INTO results (k1, k2, {', '.join(SUMMARY_COLUMNS)}, schedule, size, accessed) "
+                f"VALUES (?, ?, {', '.join('?' * len(SUMMARY_COLUMNS))}, ?, ?, ?) "
+                f"ON CONFLICT (k1, k2) DO UPDATE SET "
+                + ', '.join(f"{column} = excluded.{column}" for column in SUMMARY_COLUMNS + ['schedule', 'size', 'accessed']), rows)
+        self.evict()
+
+    def _total(self, name):
+        return self.connection.execute("SELECT value FROM totals WHERE name = ?", (name,)).fetchone()[0]
+
+    def size(self):
+        return self._total('bytes')
+
+    def evict(self):
+        """Drop least recently read entries until the store is below 90% of `max_bytes`."""
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return 0
+        excess += self.max_bytes // 10
+        victims = []
+        for k1, k2, size in self.connection.execute("SELECT k1, k2, size FROM results ORDER BY accessed"):
+            victims.append((k1, k2))
+            excess -= size
+            if excess <= 0:
+                break
+        with self.connection as connection:
+            connection.executemany("DELETE FROM results WHERE k1 = ? AND k2 = ?", victims)
+        self.evictions += len(victims)
+        return len(victims)
+
+    def clear(self):
+        with self.connection as connection:
+            connection.execute("DELETE FROM results")
+
+    def stats(self):
+        return {
+            'entries': self._total('entries'),
+            'bytes': self.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def cached_results(portfolio, store):
+    """`portfolio.results()`, computing only the loans not already in `store`.
+
+    The portfolio does not need to be run; the missing loans are priced as a smaller
+    portfolio (invalid loans are NaN) and written back to the store.
+    """
+    k1, k2 = portfolio_hashes(portfolio)
+    found, results = store.get_summaries(k1, k2)
+    missing = np.flatnonzero(~found)
+    if missing.size:
+        subset = MortgagePortfolio(*[values[missing] for values in _portfolio_inputs(portfolio)],
+                                   validate=False, rounding=portfolio.rounding)
+        subset.run()
+        computed = subset.results()
+        for column in SUMMARY_COLUMNS:
+            results[column][missing] = computed[column]
+        store.put_summaries(k1[missing], k2[missing], computed)
+    return results
+
+
+def cached_batch(df, store):
+    """Like PortfolioClass.calculate_batch, but reusing stored loans; invalid loans are NaN."""
+    return cached_results(portfolio_from_frame(df, validate=False), store)
+
+
+def cached_run(store, mortgage):
+    """Run a MortgageCalculator, or restore its schedule and results from `store`."""
+    from AmortizationEngine import _new_schedule
+
+    key = mortgage_hash(mortgage)
+    stored = store.get_schedule(key)
+    if stored is None:
+        mortgage.run()
+        summary = {column: getattr(mortgage, column) for column in SUMMARY_COLUMNS}
+        store.put_schedule(key, summary, mortgage.schedule)
+        return mortgage
+
+    summary, columns = stored
+    mortgage.calculate_mortgage_payment()
+    extra_amounts, extra_types = None, None
+    if mortgage.prepayments is not None:
+        extra_amounts, extra_types = mortgage.prepayments.dense(mortgage.loan_term_months)
+        if mortgage.rounding is not None:
+            extra_amounts = round_cents(extra_amounts, mortgage.rounding) / 100
+    schedule = _new_schedule(mortgage.debt, mortgage.monthly_rate, mortgage.loan_term_months, extra_amounts, extra_types)
+    schedule.rounding = mortgage.rounding
+    schedule.initial_state['monthly_payment'] = mortgage.monthly_payment
+    length = len(columns['payment_number'])
+    for field, values in columns.items():
+        getattr(schedule, field)[:length] = values
+    schedule.truncate(length)
+    # The state after the last month is the last row
+    schedule.final_state = schedule.state_at(length + 1)
+    mortgage.schedule = schedule
+    mortgage.set_schedule_state(schedule.final_state)
+    mortgage.apr = summary['apr']
+    mortgage.calculate_totals()
+    return mortgage
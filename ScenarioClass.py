@@ -0,0 +1,197 @@
+import numpy as np
+from PortfolioClass import PORTFOLIO_COLUMNS, MortgagePortfolio
+from AmortizationEngine import extra_payment_arrays
+from JitEngine import batch_schedule_summary, compiled_schedule
+from CentsEngine import cents_schedule
+
+# Summary metrics of a ScenarioSet, in display order
+SCENARIO_METRICS = [
+    'initial_monthly_payment',
+    'monthly_payment',
+    'months_paid',
+    'total_interest_paid',
+    'total_fees_monthly',
+    'lifetime_cost',
+    'apr',
+    'financing_percentage',
+    'down_payment',
+    'total_mortgage',
+]
+
+
+class Scenario:
+    """One evaluated scenario of a ScenarioSet, with the attributes of a MortgageCalculator after run().
+
+    The schedule is only computed when it is first read, e.g. by GraphicClass.
+    """
+
+    def __init__(self, scenarios, index):
+        self.name = scenarios.names[index]
+        self.index = index
+        self._scenarios = scenarios
+        portfolio = scenarios.portfolio
+        for attribute in ('house_price', 'cash', 'interest_rate', 'monthly_rate', 'loan_term_years', 'loan_term_months',
+                          'cost', 'taxes', 'bank_fees', 'bank_fees_monthly', 'taxes_cost_fees', 'debt',
+                          'total_cost', 'total_paid'):
+            setattr(self, attribute, float(getattr(portfolio, attribute)[index]))
+        self.loan_term_years = int(self.loan_term_years)
+        for metric, values in scenarios.results.items():
+            setattr(self, metric, values[index].item())
+
+    @property
+    def schedule(self):
+        return self._scenarios.schedule(self.index)
+
+    def get_amortization_schedule(self):
+        return self.schedule.to_frame()
+
+
+class ScenarioSet:
+    """N variations (offers, rates, prepayment plans) of shared loan inputs, evaluated together.
+
+    `base` holds the common PORTFOLIO_COLUMNS inputs (interest rate in %); each scenario
+    overrides some of them and may add an extra amortization table. `run` prices all
+    scenarios in one MortgagePortfolio and one batched schedule pass.
+    """
+
+    def __init__(self, base, rounding=None):
+        unknown = set(base) - set(PORTFOLIO_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown inputs: {', '.join(sorted(unknown))}")
+        missing = [column for column, default in PORTFOLIO_COLUMNS.items() if default is None and column not in base]
+        if missing:
+            raise ValueError(f"Missing inputs: {', '.join(missing)}")
+        self.base = {column: base.get(column, default) for column, default in PORTFOLIO_COLUMNS.items()}
+        self.rounding = rounding
+        self.names = []
+        self.overrides = []
+        self.amortization_schedules = []
+        self.results = None
+        self._schedules = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, amortization_schedule_df=None, **overrides):
+        """Add a scenario; `overrides` replace base inputs, e.g. interest_rate=2.1, bank_fees=0."""
+        if name in self.names:
+            raise ValueError(f"Scenario '{name}' already exists.")
+        unknown = set(overrides) - set(PORTFOLIO_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown inputs: {', '.join(sorted(unknown))}")
+        self.names.append(name)
+        self.overrides.append(overrides)
+        self.amortization_schedules.append(amortization_schedule_df)
+        self.results = None
+        return self
+
+    def index(self, scenario):
+        """Position of a scenario given by name or position."""
+        if isinstance(scenario, str):
+            if scenario not in self.names:
+                raise ValueError(f"Unknown scenario '{scenario}'.")
+            return self.names.index(scenario)
+        return int(scenario)
+
+    def inputs(self):
+        """{column: array over scenarios} of the effective inputs."""
+        return {column: np.array([overrides.get(column, default) for overrides in self.overrides], dtype=np.float64)
+                for column, default in self.base.items()}
+
+    def extra_payments(self):
+        """(amounts, type codes) arrays of shape (scenarios, longest term)."""
+        months = (self.inputs()['loan_term_years'] * 12).astype(np.int64)
+        width = int(months.max()) if len(months) else 0
+        amounts = np.zeros((len(self), width))
+        types = np.zeros((len(self), width), dtype=np.int8)
+        for i, df in enumerate(self.amortization_schedules):
+            if df is not None:
+                amounts[i, :months[i]], types[i, :months[i]] = extra_payment_arrays(df, months[i])
+        return amounts, types
+
+    def run(self):
+        if not len(self):
+            raise ValueError("No scenarios to evaluate.")
+        # Invalid scenarios are reported as NaN, so one bad offer does not hide the others
+        portfolio = MortgagePortfolio(**self.inputs(), validate=False, rounding=self.rounding)
+        portfolio.run()
+        summary = portfolio.results()
+        self.portfolio = portfolio
+        self._schedules = {}
+
+        months = portfolio.loan_term_months.astype(np.int64)
+        extra_amounts, extra_types = self.extra_payments()
+        if self.rounding is None:
+            final = batch_schedule_summary(portfolio.debt, portfolio.monthly_rate, months, extra_amounts, extra_types)
+        else:
+            # The exact-cents engine has no batched prepayment path; scenarios are few
+            final = {name: np.full(len(self), np.nan) for name in ('monthly_payment', 'total_interest_paid', 'months_paid')}
+            for i in np.flatnonzero(portfolio.valid):
+                schedule = self.schedule(i)
+                final['monthly_payment'][i] = schedule.final_state['monthly_payment']
+                final['total_interest_paid'][i] = schedule.final_state['total_interest_paid']
+                final['months_paid'][i] = len(schedule)
+
+        valid = portfolio.valid
+        months_paid = np.where(valid, final['months_paid'], np.nan)
+        total_interest_paid = np.where(valid, final['total_interest_paid'], np.nan)
+        total_fees_monthly = portfolio.bank_fees_monthly * months_paid
+        self.results = {
+            'initial_monthly_payment': summary['monthly_payment'],
+            'monthly_payment': np.where(valid, final['monthly_payment'], np.nan),
+            'months_paid': months_paid,
+            'total_interest_paid': total_interest_paid,
+            'total_fees_monthly': total_fees_monthly,
+            # Everything paid over the life of the loan: property, taxes and fees, interest, monthly fees
+            'lifetime_cost': portfolio.total_cost + total_interest_paid + total_fees_monthly,
+            'apr': summary['apr'],
+            'financing_percentage': summary['financing_percentage'],
+            'down_payment': summary['down_payment'],
+            'total_mortgage': np.where(valid, portfolio.total_mortgage, np.nan),
+        }
+        return self.results
+
+    def schedule(self, scenario):
+        """AmortizationSchedule of one scenario, computed on first use."""
+        index = self.index(scenario)
+        if index not in self._schedules:
+            if not self.portfolio.valid[index]:
+                raise ValueError(f"Scenario '{self.names[index]}': down payment cannot be greater than house price.")
+            portfolio = self.portfolio
+            months = int(portfolio.loan_term_months[index])
+            extra_amounts, extra_types = None, None
+            if self.amortization_schedules[index] is not None:
+                extra_amounts, extra_types = extra_payment_arrays(self.amortization_schedules[index], months)
+            if self.rounding is not None:
+                schedule, _ = cents_schedule(portfolio.debt[index], portfolio.monthly_rate[index], months,
+                                             extra_amounts, extra_types, self.rounding)
+            else:
+                schedule, _ = compiled_schedule(portfolio.debt[index], portfolio.monthly_rate[index], months,
+                                                extra_amounts, extra_types)
+            self._schedules[index] = schedule
+        return self._schedules[index]
+
+    def scenarios(self):
+        """Evaluated scenarios as Scenario objects, in insertion order."""
+        if self.results is None:
+            self.run()
+        return [Scenario(self, i) for i in range(len(self))]
+
+    def diff(self, baseline=0):
+        """{metric: array} of every scenario minus the `baseline` scenario (name or position)."""
+        if self.results is None:
+            self.run()
+        index = self.index(baseline)
+        return {metric: values - values[index] for metric, values in self.results.items()}
+
+    def to_frame(self, baseline=None):
+        """Summary metrics as a DataFrame indexed by scenario name, plus `<metric>_diff` columns against `baseline`."""
+        import pandas as pd
+
+        if self.results is None:
+            self.run()
+        df = pd.DataFrame({metric: self.results[metric] for metric in SCENARIO_METRICS}, index=pd.Index(self.names, name='scenario'))
+        if baseline is not None:
+            for metric, values in self.diff(baseline).items():
+                df[f"{metric}_diff"] = values
+        return df
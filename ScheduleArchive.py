@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+from ScheduleClass import SCHEDULE_COLUMNS, FLOAT_FIELDS, INT_FIELDS
+
+# Field -> dtype of its file; the values are the raw (unrounded) engine output
+ARCHIVE_FIELDS = {field: np.float64 for field in FLOAT_FIELDS}
+ARCHIVE_FIELDS.update({field: np.int32 for field in INT_FIELDS})
+
+
+def _header(dtype, length):
+    return {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': (length,)}
+
+
+class _ArrayFile:
+    """A 1D .npy file grown by appending; the shape in the header is fixed up on close."""
+
+    def __init__(self, path, dtype):
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._file = open(path, 'wb')
+        np.lib.format.write_array_header_1_0(self._file, _header(self.dtype, 0))
+        self._data_start = self._file.tell()
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        values.tofile(self._file)
+        self.length += len(values)
+
+    def close(self):
+        if self._file.closed:
+            return
+        # numpy pads headers so the length can grow to 21 digits without moving the data
+        self._file.seek(0)
+        np.lib.format.write_array_header_1_0(self._file, _header(self.dtype, self.length))
+        if self._file.tell() != self._data_start:
+            raise ValueError(f"Header of {self._file.name} changed size.")
+        self._file.close()
+
+
+class ScheduleArchiveWriter:
+    """Write full schedules of many loans to a directory of memory-mappable .npy files.
+
+    Layout: `loan_id.npy` (loans), `offset.npy` (loans + 1 row offsets, loan i owns rows
+    offset[i]:offset[i + 1]) and one `<field>.npy` per schedule field, all loans back to back.
+    Schedules are appended batch by batch, so memory stays bounded by one batch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._loan_ids = _ArrayFile(os.path.join(path, 'loan_id.npy'), np.int64)
+        self._offsets = _ArrayFile(os.path.join(path, 'offset.npy'), np.int64)
+        self._offsets.append([0])
+        self._fields = {field: _ArrayFile(os.path.join(path, f"{field}.npy"), dtype) for field, dtype in ARCHIVE_FIELDS.items()}
+        self.rows = 0
+
+    def write(self, loan_ids, schedules):
+        """Append AmortizationSchedules, one per loan id."""
+        loan_ids = np.asarray(loan_ids)
+        if loan_ids.dtype.kind not in 'iu':
+            raise ValueError("Schedule archives need integer loan ids.")
+        if len(loan_ids) != len(schedules):
+            raise ValueError("One loan id is needed per schedule.")
+        if not len(schedules):
+            return
+        lengths = np.array([len(schedule) for schedule in schedules], dtype=np.int64)
+        self._loan_ids.append(loan_ids)
+        self._offsets.append(self.rows + np.cumsum(lengths))
+        for field, array_file in self._fields.items():
+            array_file.append(np.concatenate([schedule.column(field) for schedule in schedules]))
+        self.rows += int(lengths.sum())
+
+    def close(self):
+        for array_file in (self._loan_ids, self._offsets, *self._fields.values()):
+            array_file.close()
+
+
+class ScheduleArchive:
+    """Read side of a ScheduleArchiveWriter directory.
+
+    Every file is memory-mapped, so opening an archive reads nothing but the headers and
+    slicing out one loan only touches that loan's pages.
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = path
+        self.loan_ids = np.load(os.path.join(path, 'loan_id.npy'), mmap_mode=mmap_mode)
+        self.offsets = np.load(os.path.join(path, 'offset.npy'), mmap_mode=mmap_mode)
+        self.fields = {field: np.load(os.path.join(path, f"{field}.npy"), mmap_mode=mmap_mode) for field in ARCHIVE_FIELDS}
+        self._sorter = None
+        self._sorted_ids = None
+
+    def __len__(self):
+        return len(self.loan_ids)
+
+    @property
+    def rows(self):
+        return int(self.offsets[-1])
+
+    def positions(self, loan_ids):
+        """Positions of loan ids in the archive (array in, array out); unknown ids raise a ValueError."""
+        loan_ids = np.asarray(loan_ids)
+        if self._sorter is None:
+            # Pipeline output is usually already sorted; skip the argsort then
+            ids = np.asarray(self.loan_ids)
+            self._sorter = np.arange(len(ids)) if np.all(ids[1:] >= ids[:-1]) else np.argsort(ids, kind='stable')
+            self._sorted_ids = ids[self._sorter]
+        wanted = np.atleast_1d(loan_ids)
+        found = np.searchsorted(self._sorted_ids, wanted)
+        missing = found >= len(self._sorted_ids)
+        missing[~missing] = self._sorted_ids[found[~missing]] != wanted[~missing]
+        if missing.any():
+            raise ValueError(f"Unknown loan ids: {wanted[missing][:10].tolist()}")
+        positions = self._sorter[found]
+        return positions.reshape(loan_ids.shape)
+
+    def rows_of(self, loan_id):
+        """(start, stop) row range of one loan."""
+        position = int(self.positions(loan_id))
+        return int(self.offsets[position]), int(self.offsets[position + 1])
+
+    def loan(self, loan_id):
+        """{field: memory-mapped view} of one loan's schedule."""
+        start, stop = self.rows_of(loan_id)
+        return {field: values[start:stop] for field, values in self.fields.items()}
+
+    def frame(self, loan_id):
+        """One loan's schedule as a DataFrame, with the columns of AmortizationSchedule.to_frame."""
+        import pandas as pd
+
+        columns = self.loan(loan_id)
+        return pd.DataFrame({name: np.round(columns[field], 2) if rounded else np.array(columns[field])
+                             for name, (field, rounded) in SCHEDULE_COLUMNS.items()})
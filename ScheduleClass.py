@@ -0,0 +1,122 @@
+import numpy as np
+
+# DataFrame column -> (field, rounded)
+SCHEDULE_COLUMNS = {
+    'Payment Number': ('payment_number', False),
+    'Monthly Payment': ('monthly_payment', True),
+    'Total Payment': ('total_payment', True),
+    'Regular Amortization': ('regular_amortization', True),
+    'Additional Amortization': ('additional_amortization', True),
+    'Total Amortization': ('total_amortization', True),
+    'Amortization Type': ('additional_amortization', False),
+    'Interest': ('interest', True),
+    'Remaining Balance': ('remaining_balance', True),
+    'Accrued Interest': ('accrued_interest', True),
+    'Remaining Months': ('remaining_months', False),
+    'Remaining Balance (after payment)': ('remaining_balance', True),
+}
+
+FLOAT_FIELDS = (
+    'monthly_payment',
+    'total_payment',
+    'regular_amortization',
+    'additional_amortization',
+    'total_amortization',
+    'interest',
+    'remaining_balance',
+    'accrued_interest',
+)
+
+INT_FIELDS = ('payment_number', 'remaining_months')
+
+
+class AmortizationSchedule:
+    """Columnar amortization schedule backed by preallocated arrays, one row per month."""
+
+    __slots__ = (
+        '_data', '_ints', 'length', '_frame',
+        'debt', 'monthly_rate', 'extra_amounts', 'extra_types', 'initial_state', 'final_state', 'rounding',
+    ) + FLOAT_FIELDS + INT_FIELDS
+
+    def __init__(self, months):
+        months = int(months)
+        # One 2D block per dtype; each field is a row view into it
+        self._data = np.zeros((len(FLOAT_FIELDS), months), dtype=np.float64)
+        self._ints = np.zeros((len(INT_FIELDS), months), dtype=np.int32)
+        for i, field in enumerate(FLOAT_FIELDS):
+            setattr(self, field, self._data[i])
+        for i, field in enumerate(INT_FIELDS):
+            setattr(self, field, self._ints[i])
+        self.payment_number[:] = np.arange(1, months + 1)
+        self.length = months
+        self._frame = None
+
+        # Inputs, kept so the schedule can be recomputed after an edit
+        self.debt = None
+        self.monthly_rate = None
+        self.extra_amounts = np.zeros(months, dtype=np.float64)
+        self.extra_types = np.zeros(months, dtype=np.int8)
+        self.initial_state = None
+        self.final_state = None
+        # None for the float engine, else the rounding mode of the exact-cents engine
+        self.rounding = None
+
+    def __len__(self):
+        return self.length
+
+    def truncate(self, length):
+        """Keep only the first `length` months."""
+        self.length = length
+        self._frame = None
+
+    def column(self, field):
+        """Zero-copy view of a field over the filled months."""
+        return getattr(self, field)[:self.length]
+
+    def state_at(self, month):
+        """State (payment, remaining months, balance, accrued interest) at the start of `month`."""
+        if month == 1:
+            return dict(self.initial_state)
+        if not 1 < month <= self.length + 1:
+            raise ValueError(f"No schedule state for month {month}.")
+        i = month - 2
+        return {
+            'monthly_payment': float(self.monthly_payment[i]),
+            'remaining_months': int(self.remaining_months[i]),
+            'remaining_balance': float(self.remaining_balance[i]),
+            'total_interest_paid': float(self.accrued_interest[i]),
+        }
+
+    def apply_edit(self, month, amount, amort_type=None):
+        """Set the extra payment of `month` and recompute only the months from there on."""
+        from AmortizationEngine import TYPE_CODES, TYPE_NONE, resume_schedule  # circular import
+
+        if not 1 <= month <= len(self.extra_amounts):
+            raise ValueError(f"Month {month} is outside the loan term.")
+        self.extra_amounts[month - 1] = amount
+        self.extra_types[month - 1] = TYPE_CODES.get(amort_type, TYPE_NONE)
+        if month > self.length:
+            # The loan is already repaid before this month
+            return self.final_state
+        if self.rounding is not None:
+            from CentsEngine import resume_cents_schedule
+            return resume_cents_schedule(self, month)
+        return resume_schedule(self, month)
+
+    @property
+    def nbytes(self):
+        size = self._data.nbytes + self._ints.nbytes
+        if self._frame is not None:
+            size += int(self._frame.memory_usage(deep=False).sum())
+        return size
+
+    def to_frame(self):
+        """Return the schedule as a DataFrame, built once and cached."""
+        if self._frame is None:
+            import pandas as pd
+            columns = {}
+            for name, (field, rounded) in SCHEDULE_COLUMNS.items():
+                values = self.column(field)
+                columns[name] = np.round(values, 2) if rounded else values
+            self._frame = pd.DataFrame(columns)
+        return self._frame
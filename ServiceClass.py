@@ -0,0 +1,264 @@
+import json
+import time
+import asyncio
+import bisect
+
+import numpy as np
+import pandas as pd
+from PortfolioClass import PORTFOLIO_COLUMNS, MortgagePortfolio
+from MortgageClass import MortgageCalculator
+from ScheduleClass import SCHEDULE_COLUMNS
+from PrepaymentClass import PrepaymentPlan
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyHistogram:
+    """Request latency counts in fixed millisecond buckets."""
+
+    BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, seconds):
+        elapsed_ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+
+    def to_dict(self):
+        labels = [f"<={bucket}ms" for bucket in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else None,
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class QuoteBatcher:
+    """Collect concurrent quote requests for `window` seconds and price them in one MortgagePortfolio."""
+
+    def __init__(self, window=0.002, max_batch=1024):
+        self.window = window
+        self.max_batch = max_batch
+        self.batch_sizes = []
+        self._pending = []
+        self._timer = None
+
+    async def quote(self, loan):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((loan, future))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self.batch_sizes.append(len(pending))
+
+        try:
+            columns = {column: np.array([loan[column] for loan, _ in pending], dtype=np.float64) for column in PORTFOLIO_COLUMNS}
+            portfolio = MortgagePortfolio(**columns, validate=False)
+            portfolio.run()
+            results = portfolio.results()
+        except Exception as error:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for i, (_, future) in enumerate(pending):
+            if future.done():
+                continue
+            if not portfolio.valid[i]:
+                future.set_exception(HTTPError(400, "Down payment cannot be greater than house price."))
+            else:
+                future.set_result({name: _json_number(values[i]) for name, values in results.items()})
+
+
+def _json_number(value):
+    # json.dumps would write NaN/Infinity, which strict JSON parsers reject
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def parse_loan(payload):
+    """Validate a JSON loan and fill the optional fields with their defaults.
+
+    An optional `amortization_schedule` (rows or columns of Month, Amortization, Type) is
+    validated into `loan['prepayments']`, a PrepaymentPlan, or None when absent.
+    """
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "Expected a JSON object.")
+    loan = {}
+    for column, default in PORTFOLIO_COLUMNS.items():
+        value = payload.get(column, default)
+        if value is None:
+            raise HTTPError(400, f"Missing field '{column}'.")
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise HTTPError(400, f"Field '{column}' must be a number.")
+        loan[column] = value
+    if loan['loan_term_years'] != int(loan['loan_term_years']):
+        raise HTTPError(400, "Field 'loan_term_years' must be a whole number of years.")
+    loan['loan_term_years'] = int(loan['loan_term_years'])
+
+    loan['prepayments'] = None
+    if payload.get('amortization_schedule'):
+        try:
+            amortization_df = pd.DataFrame(payload['amortization_schedule'])
+            loan['prepayments'] = PrepaymentPlan.from_frame(amortization_df, loan['loan_term_years'] * 12)
+        except (ValueError, TypeError) as error:
+            raise HTTPError(400, f"Invalid 'amortization_schedule': {error}")
+    return loan
+
+
+def build_schedule(loan):
+    """Run the calculator for a parsed loan; blocking, meant for a worker thread."""
+    mortgage = MortgageCalculator(loan['house_price'], loan['cash'], loan['interest_rate'], loan['loan_term_years'],
+                                  loan['cost'], loan['taxes'], loan['bank_fees'], loan['bank_fees_monthly'],
+                                  amortization_schedule_df=loan['prepayments'])
+    mortgage.run()
+    return mortgage
+
+
+class PricingService:
+    """ASGI application exposing the calculator over HTTP.
+
+    POST /quote     one loan -> summary metrics (concurrent requests are micro-batched)
+    POST /schedule  one loan (+ optional extra amortization rows) -> NDJSON schedule rows
+    GET  /metrics   latency histograms per route and batch sizes
+    """
+
+    def __init__(self, batch_window=0.002, max_batch=1024, schedule_chunk_rows=120):
+        self.batcher = QuoteBatcher(batch_window, max_batch)
+        self.schedule_chunk_rows = schedule_chunk_rows
+        self.latency = {}
+        self.routes = {
+            ('POST', '/quote'): self.quote,
+            ('POST', '/schedule'): self.schedule,
+            ('GET', '/metrics'): self.metrics,
+            ('GET', '/health'): self.health,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        start = time.perf_counter()
+        route = (scope['method'], scope['path'])
+        try:
+            handler = self.routes.get(route)
+            if handler is None:
+                raise HTTPError(404, f"No route for {scope['method']} {scope['path']}.")
+            await handler(receive, send)
+        except HTTPError as error:
+            await self.send_json(send, {'error': str(error)}, status=error.status)
+        finally:
+            self.latency.setdefault(f"{route[0]} {route[1]}", LatencyHistogram()).record(time.perf_counter() - start)
+
+    async def read_json(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        try:
+            return json.loads(body or b'null')
+        except ValueError:
+            raise HTTPError(400, "Invalid JSON body.")
+
+    async def send_json(self, send, payload, status=200):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+    async def quote(self, receive, send):
+        loan = parse_loan(await self.read_json(receive))
+        await self.send_json(send, await self.batcher.quote(loan))
+
+    async def schedule(self, receive, send):
+        loan = parse_loan(await self.read_json(receive))
+        try:
+            # Off the event loop, so long schedules do not stall /quote batching or each other
+            mortgage = await asyncio.get_running_loop().run_in_executor(None, build_schedule, loan)
+        except (ValueError, KeyError) as error:
+            raise HTTPError(400, str(error))
+
+        # Stream one JSON object per month, a chunk of rows per message
+        schedule = mortgage.schedule
+        columns = [(name, np.round(schedule.column(field), 2) if rounded else schedule.column(field))
+                   for name, (field, rounded) in SCHEDULE_COLUMNS.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/x-ndjson')]})
+        for start in range(0, len(schedule), self.schedule_chunk_rows):
+            stop = min(start + self.schedule_chunk_rows, len(schedule))
+            lines = [json.dumps({name: _json_number(values[i]) if values.dtype.kind == 'f' else values[i].item() for name, values in columns})
+                     for i in range(start, stop)]
+            await send({'type': 'http.response.body', 'body': ('\n'.join(lines) + '\n').encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def metrics(self, receive, send):
+        await self.send_json(send, {
+            'latency': {route: histogram.to_dict() for route, histogram in self.latency.items()},
+            'quote_batches': len(self.batcher.batch_sizes),
+            'mean_quote_batch_size': float(np.mean(self.batcher.batch_sizes)) if self.batcher.batch_sizes else None,
+        })
+
+    async def health(self, receive, send):
+        await self.send_json(send, {'status': 'ok'})
+
+
+class LocalClient:
+    """Call an ASGI app in-process, without sockets (for tests and local scripts)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, payload=None):
+        messages = [{'type': 'http.request', 'body': b'' if payload is None else json.dumps(payload).encode(), 'more_body': False}]
+        response = {'status': None, 'headers': {}, 'chunks': []}
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {key.decode(): value.decode() for key, value in message['headers']}
+            elif message['type'] == 'http.response.body':
+                response['chunks'].append(message.get('body', b''))
+
+        scope = {'type': 'http', 'method': method, 'path': path, 'headers': []}
+        await self.app(scope, receive, send)
+        return response['status'], response['headers'], b''.join(response['chunks'])
+
+    async def post(self, path, payload):
+        return await self.request('POST', path, payload)
+
+    async def get(self, path):
+        return await self.request('GET', path)
+
+
+# Run with an ASGI server, e.g. `uvicorn ServiceClass:app`
+app = PricingService()
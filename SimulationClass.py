@@ -0,0 +1,202 @@
+import numpy as np
+from AprSolver import annuity_payment
+
+# Bins per column of the streaming histograms behind the percentiles
+HISTOGRAM_BINS = 2**14
+
+
+class _StreamingHistogram:
+    """Fixed-size histogram per column, with a range that follows the running min/max of the column.
+
+    The first values set each column's range; values outside it widen the bins by a power of
+    two and fold the counts into the wider bins, so no value ever falls outside the histogram.
+    """
+
+    def __init__(self, n_columns, n_bins=HISTOGRAM_BINS):
+        self.n_bins = n_bins
+        self.counts = np.zeros((n_columns, n_bins), dtype=np.int64)
+        self.low = np.full(n_columns, np.nan)
+        self.width = np.full(n_columns, np.nan)
+        self.minimum = np.full(n_columns, np.inf)
+        self.maximum = np.full(n_columns, -np.inf)
+
+    def _fit(self, column, low, high):
+        """Widen the bins of `column` until they cover [low, high]."""
+        if np.isnan(self.low[column]):
+            self.low[column] = low
+            # A column with a single value still needs bins of some width
+            self.width[column] = max(high - low, abs(low) * 1e-12, 1e-12) / self.n_bins * (1 + 1e-9)
+            return
+        old_low, width = self.low[column], self.width[column]
+        if low >= old_low and high < old_low + self.n_bins * width:
+            return
+        shift = max(int(np.ceil((old_low - low) / width)), 0)
+        scale = 1
+        while old_low - shift * width + self.n_bins * width * scale <= high:
+            scale *= 2
+        # Old bin i lies inside new bin (i + shift) // scale: whole bins move, nothing is split
+        folded = np.zeros(self.n_bins, dtype=np.int64)
+        # Bins past the new range are above the running max, so empty
+        np.add.at(folded, np.minimum((np.arange(self.n_bins) + shift) // scale, self.n_bins - 1), self.counts[column])
+        self.counts[column] = folded
+        self.low[column] = old_low - shift * width
+        self.width[column] = width * scale
+
+    def add(self, values):
+        """Count the rows of `values` (rows, columns)."""
+        low, high = values.min(axis=0), values.max(axis=0)
+        self.minimum = np.minimum(self.minimum, low)
+        self.maximum = np.maximum(self.maximum, high)
+        for column in range(len(self.low)):
+            self._fit(column, self.minimum[column], self.maximum[column])
+        bins = np.clip(((values - self.low) / self.width).astype(np.int64), 0, self.n_bins - 1)
+        bins += np.arange(len(self.low)) * self.n_bins
+        self.counts += np.bincount(bins.ravel(), minlength=self.counts.size).reshape(self.counts.shape)
+
+    def percentiles(self, q):
+        """(len(q), columns) percentiles, interpolated inside their bin and kept within the column's min/max."""
+        cumulative = np.cumsum(self.counts, axis=1)
+        rows = np.arange(len(self.low))
+        result = np.empty((len(q), len(self.low)))
+        for i, percentile in enumerate(q):
+            target = percentile / 100 * cumulative[:, -1]
+            index = np.minimum((cumulative < target[:, np.newaxis]).sum(axis=1), self.n_bins - 1)
+            count = self.counts[rows, index]
+            before = cumulative[rows, index] - count
+            fraction = np.where(count > 0, (target - before) / np.maximum(count, 1), 0)
+            result[i] = np.clip(self.low + (index + fraction) * self.width, self.minimum, self.maximum)
+        return result
+
+
+class RandomWalkModel:
+    """Index rate (in %) following a Gaussian random walk with optional drift, per year."""
+
+    def __init__(self, initial_rate, volatility, drift=0):
+        self.initial_rate = initial_rate
+        self.volatility = volatility
+        self.drift = drift
+
+    def simulate(self, n_paths, n_periods, dt, rng):
+        shocks = rng.standard_normal((n_paths, n_periods - 1))
+        steps = self.drift * dt + self.volatility * np.sqrt(dt) * shocks
+        paths = np.empty((n_paths, n_periods))
+        paths[:, 0] = self.initial_rate
+        np.cumsum(steps, axis=1, out=paths[:, 1:])
+        paths[:, 1:] += self.initial_rate
+        return paths
+
+
+class VasicekModel:
+    """Mean-reverting index rate (in %), dr = speed * (mean - r) dt + volatility dW, sampled exactly."""
+
+    def __init__(self, initial_rate, mean, speed, volatility):
+        self.initial_rate = initial_rate
+        self.mean = mean
+        self.speed = speed
+        self.volatility = volatility
+
+    def simulate(self, n_paths, n_periods, dt, rng):
+        decay = np.exp(-self.speed * dt)
+        if self.speed > 0:
+            scale = self.volatility * np.sqrt((1 - decay ** 2) / (2 * self.speed))
+        else:
+            scale = self.volatility * np.sqrt(dt)
+        shocks = rng.standard_normal((n_paths, n_periods - 1))
+        paths = np.empty((n_paths, n_periods))
+        paths[:, 0] = self.initial_rate
+        for period in range(1, n_periods):
+            paths[:, period] = self.mean + (paths[:, period - 1] - self.mean) * decay + scale * shocks[:, period - 1]
+        return paths
+
+
+class VariableRateSimulation:
+    """Monte Carlo simulation of a variable-rate mortgage: index + spread, re-amortized at every reset.
+
+    Paths are simulated `chunk_size` at a time and folded into histograms that follow each
+    period's min/max, so memory does not grow with `n_paths`; percentiles are then accurate to
+    one bin (at most 1/8192 of the period's range). `keep_paths=True` also stores every path and gives
+    exact percentiles.
+    """
+
+    def __init__(self, debt, loan_term_years, rate_model, spread=0, reset_months=12, rate_floor=0, n_paths=10000, chunk_size=20000, seed=None,
+                 keep_paths=False):
+        self.debt = debt
+        self.loan_term_years = loan_term_years
+        self.loan_term_months = int(loan_term_years * 12)
+        self.rate_model = rate_model
+        self.spread = spread
+        self.reset_months = reset_months
+        self.rate_floor = rate_floor
+        self.n_paths = n_paths
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.keep_paths = keep_paths
+        self.n_periods = -(-self.loan_term_months // reset_months)
+
+    def simulate_chunk(self, n_paths, rng):
+        """Return (annual rates, payments per reset period, total interest) for `n_paths` paths."""
+        index = self.rate_model.simulate(n_paths, self.n_periods, self.reset_months / 12, rng)
+        interest_rate = np.maximum(index + self.spread, self.rate_floor)
+        payments = np.empty((n_paths, self.n_periods))
+        total_interest_paid = np.zeros(n_paths)
+        remaining_balance = np.full(n_paths, float(self.debt))
+        remaining_months = self.loan_term_months
+
+        for period in range(self.n_periods):
+            monthly_rate = interest_rate[:, period] / 100 / 12
+            months = min(self.reset_months, remaining_months)
+
+            # Re-amortize the outstanding balance over the remaining term at the new rate
+            with np.errstate(divide='ignore', invalid='ignore'):
+                monthly_payment = annuity_payment(monthly_rate, remaining_months, remaining_balance)
+                growth = (1 + monthly_rate) ** months
+                balance = np.where(
+                    monthly_rate == 0,
+                    remaining_balance - monthly_payment * months,
+                    remaining_balance * growth - monthly_payment * (growth - 1) / np.where(monthly_rate == 0, 1, monthly_rate),
+                )
+            balance = np.maximum(balance, 0)
+
+            payments[:, period] = monthly_payment
+            total_interest_paid += monthly_payment * months - (remaining_balance - balance)
+            remaining_balance = balance
+            remaining_months -= months
+
+        return interest_rate, payments, total_interest_paid
+
+    def run(self):
+        rng = np.random.default_rng(self.seed)
+        initial_rate = max(self.rate_model.initial_rate + self.spread, self.rate_floor)
+        self.initial_payment = float(annuity_payment(initial_rate / 100 / 12, self.loan_term_months, float(self.debt)))
+        self.payment_histogram = _StreamingHistogram(self.n_periods)
+        self.interest_histogram = _StreamingHistogram(1)
+        if self.keep_paths:
+            self.payments = np.empty((self.n_paths, self.n_periods))
+            self.total_interest_paid = np.empty(self.n_paths)
+
+        for start in range(0, self.n_paths, self.chunk_size):
+            stop = min(start + self.chunk_size, self.n_paths)
+            _, payments, total_interest_paid = self.simulate_chunk(stop - start, rng)
+            self.payment_histogram.add(payments)
+            self.interest_histogram.add(total_interest_paid[:, np.newaxis])
+            if self.keep_paths:
+                self.payments[start:stop], self.total_interest_paid[start:stop] = payments, total_interest_paid
+        return self.percentiles()
+
+    def percentiles(self, q=(5, 25, 50, 75, 95)):
+        """Percentiles of the monthly payment in each reset period and of the total interest."""
+        if not hasattr(self, 'payment_histogram'):
+            raise ValueError("Simulation has not been run yet.")
+        q = np.asarray(q)
+        if self.keep_paths:
+            monthly_payment = np.percentile(self.payments, q, axis=0)
+            total_interest_paid = np.percentile(self.total_interest_paid, q)
+        else:
+            monthly_payment = self.payment_histogram.percentiles(q)
+            total_interest_paid = self.interest_histogram.percentiles(q)[:, 0]
+        return {
+            'percentiles': q,
+            'period_start_month': np.arange(self.n_periods) * self.reset_months + 1,
+            'monthly_payment': monthly_payment,
+            'total_interest_paid': total_interest_paid,
+        }
@@ -0,0 +1,194 @@
+import sys
+import time
+import argparse
+
+import numpy as np
+from PortfolioClass import MortgagePortfolio, portfolio_from_frame
+
+# Edges of the 1 € payment increase histogram behind the streaming percentiles
+DELTA_BINS = np.arange(-1000, 20001, 1.0)
+
+DEFAULT_RATE_SHOCKS = (100, 200, 300)
+DEFAULT_TERM_SHOCKS = (0, -5)
+
+DETAIL_COLUMNS = ['monthly_payment', 'payment_delta', 'total_interest_paid', 'interest_delta', 'apr', 'payment_to_income', 'pti_breach']
+
+
+def shock_grid(rate_bps=DEFAULT_RATE_SHOCKS, term_years=DEFAULT_TERM_SHOCKS):
+    """Every combination of a rate shift (basis points) and a term change (years), base case first."""
+    shocks = []
+    for term in sorted(set(term_years) | {0}, key=lambda term: (term != 0, -term)):
+        for rate in sorted(set(rate_bps) | {0}):
+            name = ' '.join(part for part in (f"{rate:+d}bp" if rate else '', f"{term:+d}y" if term else '') if part) or 'base'
+            shocks.append({'name': name, 'rate_bp': rate, 'term_years': term})
+    return shocks
+
+
+class StressTest:
+    """Re-price a loan book under rate and term shocks, all shocks of a chunk in one broadcast evaluation.
+
+    Loans come in chunks, so memory is bounded by `chunk_size` x shocks whatever the size of
+    the book. Per-shock aggregates (means, sums, a payment increase histogram for percentiles
+    and payment-to-income breaches when the book has a `monthly_income` column) are updated
+    chunk by chunk; `summary` turns them into the report.
+    """
+
+    def __init__(self, shocks=None, pti_limit=0.35):
+        self.shocks = shock_grid() if shocks is None else list(shocks)
+        if not self.shocks:
+            raise ValueError("At least one shock is required.")
+        self.pti_limit = pti_limit
+        self.rate_shift = np.array([shock['rate_bp'] / 100 for shock in self.shocks])[:, np.newaxis]
+        self.term_shift = np.array([shock['term_years'] for shock in self.shocks])[:, np.newaxis]
+        n_shocks = len(self.shocks)
+        self.totals = {name: np.zeros(n_shocks) for name in
+                       ('loans', 'monthly_payment', 'payment_delta', 'payment_delta_pct', 'interest_delta',
+                        'total_interest_paid', 'apr', 'income_loans', 'pti_breaches', 'new_breaches')}
+        self.max_payment_delta = np.full(n_shocks, -np.inf)
+        self.histogram = np.zeros((n_shocks, len(DELTA_BINS) + 1), dtype=np.int64)
+
+    def evaluate(self, chunk):
+        """{metric: (shocks, loans) array} for one DataFrame of loans; invalid loans are NaN."""
+        base = portfolio_from_frame(chunk, validate=False)
+        base.run()
+        base_results = base.results()
+
+        # One portfolio of shape (shocks, loans) for every shock at once
+        shocked = MortgagePortfolio(
+            base.house_price, base.cash,
+            np.maximum(base.interest_rate * 100 + self.rate_shift, 0),
+            np.maximum(base.loan_term_years + self.term_shift, 1),
+            base.cost, base.taxes, base.bank_fees, base.bank_fees_monthly, validate=False)
+        shocked.run()
+        results = shocked.results()
+
+        details = {
+            'monthly_payment': results['monthly_payment'],
+            'payment_delta': results['monthly_payment'] - base_results['monthly_payment'],
+            'total_interest_paid': results['total_interest_paid'],
+            'interest_delta': results['total_interest_paid'] - base_results['total_interest_paid'],
+            'apr': results['apr'],
+        }
+        details['payment_delta_pct'] = details['payment_delta'] / base_results['monthly_payment'] * 100
+        if 'monthly_income' in chunk.columns:
+            income = chunk['monthly_income'].to_numpy(dtype=np.float64)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                details['payment_to_income'] = (results['monthly_payment'] + shocked.bank_fees_monthly) / income
+                base_pti = (base_results['monthly_payment'] + base.bank_fees_monthly) / income
+            details['pti_breach'] = details['payment_to_income'] > self.pti_limit
+            details['base_pti_breach'] = np.broadcast_to(base_pti > self.pti_limit, details['pti_breach'].shape)
+        else:
+            details['payment_to_income'] = np.full(results['monthly_payment'].shape, np.nan)
+            details['pti_breach'] = np.zeros(results['monthly_payment'].shape, dtype=bool)
+            details['base_pti_breach'] = details['pti_breach']
+        return details
+
+    def update(self, details):
+        """Add the per-shock aggregates of one evaluated chunk."""
+        valid = np.isfinite(details['monthly_payment'])
+        totals = self.totals
+        totals['loans'] += valid.sum(axis=1)
+        for name in ('monthly_payment', 'payment_delta', 'payment_delta_pct', 'interest_delta', 'total_interest_paid', 'apr'):
+            totals[name] += np.where(valid, details[name], 0).sum(axis=1)
+        with_income = valid & np.isfinite(details['payment_to_income'])
+        totals['income_loans'] += with_income.sum(axis=1)
+        totals['pti_breaches'] += (details['pti_breach'] & with_income).sum(axis=1)
+        totals['new_breaches'] += (details['pti_breach'] & ~details['base_pti_breach'] & with_income).sum(axis=1)
+        self.max_payment_delta = np.fmax(self.max_payment_delta, np.where(valid, details['payment_delta'], -np.inf).max(axis=1))
+        bins = np.searchsorted(DELTA_BINS, details['payment_delta'], side='right')
+        for shock in range(len(self.shocks)):
+            self.histogram[shock] += np.bincount(bins[shock][valid[shock]], minlength=self.histogram.shape[1])
+
+    def percentile(self, q):
+        """Approximate percentile of the payment increase per shock, as the lower edge of its 1 € bin."""
+        cumulative = np.cumsum(self.histogram, axis=1)
+        index = np.array([np.searchsorted(row, q / 100 * row[-1]) if row[-1] else -1 for row in cumulative])
+        lower = np.insert(DELTA_BINS, 0, -np.inf)
+        return np.where(index >= 0, lower[np.clip(index, 0, len(lower) - 1)], np.nan)
+
+    def summary(self):
+        """One row per shock, as a DataFrame."""
+        import pandas as pd
+
+        totals = self.totals
+        with np.errstate(divide='ignore', invalid='ignore'):
+            loans = totals['loans']
+            return pd.DataFrame({
+                'shock': [shock['name'] for shock in self.shocks],
+                'rate_bp': [shock['rate_bp'] for shock in self.shocks],
+                'term_years': [shock['term_years'] for shock in self.shocks],
+                'loans': loans.astype(np.int64),
+                'mean_monthly_payment': totals['monthly_payment'] / loans,
+                'mean_payment_delta': totals['payment_delta'] / loans,
+                'mean_payment_delta_pct': totals['payment_delta_pct'] / loans,
+                'p50_payment_delta': self.percentile(50),
+                'p95_payment_delta': self.percentile(95),
+                'max_payment_delta': np.where(loans > 0, self.max_payment_delta, np.nan),
+                'total_interest_paid': totals['total_interest_paid'],
+                'total_interest_delta': totals['interest_delta'],
+                'mean_apr': totals['apr'] / loans,
+                'pti_breaches': totals['pti_breaches'].astype(np.int64),
+                'new_pti_breaches': totals['new_breaches'].astype(np.int64),
+                'pti_breach_rate': totals['pti_breaches'] / totals['income_loans'],
+            })
+
+    def run(self, input_path, output_path, details_path=None, chart_path=None, chunk_size=100000, delimiter=';', verbose=True):
+        """Stress a loan file chunk by chunk and write the summary (plus optional per-loan details and HTML chart)."""
+        import pandas as pd
+        from BatchPipeline import read_chunks, ResultWriter, peak_rss_mb
+
+        start = time.perf_counter()
+        rows = 0
+        detail_writer = ResultWriter(details_path, delimiter) if details_path else None
+        try:
+            for chunk in read_chunks(input_path, chunk_size, delimiter):
+                details = self.evaluate(chunk)
+                self.update(details)
+                if detail_writer is not None:
+                    loan_ids = chunk['loan_id'].to_numpy() if 'loan_id' in chunk.columns else np.arange(rows, rows + len(chunk))
+                    n_shocks = len(self.shocks)
+                    frame = pd.DataFrame({
+                        'loan_id': np.tile(loan_ids, n_shocks),
+                        'shock': np.repeat([shock['name'] for shock in self.shocks], len(chunk)),
+                    })
+                    for name in DETAIL_COLUMNS:
+                        frame[name] = details[name].ravel().astype(np.float64)
+                    detail_writer.write(frame)
+                rows += len(chunk)
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f"{rows} loans x {len(self.shocks)} shocks, {rows / elapsed:,.0f} loans/s, peak RSS {peak_rss_mb():,.0f} MB", file=sys.stderr)
+        finally:
+            if detail_writer is not None:
+                detail_writer.close()
+
+        summary = self.summary()
+        writer = ResultWriter(output_path, delimiter)
+        writer.write(summary)
+        writer.close()
+        if chart_path:
+            from GraphicClass import GraphicClass
+            GraphicClass().stress_graph(summary).write_html(chart_path, include_plotlyjs='cdn')
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-price a loan book (CSV or Parquet) under interest rate and term shocks.")
+    parser.add_argument('input', help="Loans file, one loan per row; an optional monthly_income column enables payment-to-income checks")
+    parser.add_argument('output', help="Summary report, one row per shock (.parquet or .csv)")
+    parser.add_argument('--details', help="Optional output file with one row per loan and shock")
+    parser.add_argument('--chart', help="Optional HTML chart of the summary")
+    parser.add_argument('--rate-shocks', type=int, nargs='+', default=list(DEFAULT_RATE_SHOCKS), help="Rate shifts in basis points")
+    parser.add_argument('--term-shocks', type=int, nargs='+', default=list(DEFAULT_TERM_SHOCKS), help="Term changes in years (negative shortens)")
+    parser.add_argument('--pti-limit', type=float, default=0.35, help="Maximum payment-to-income ratio")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Loans per chunk")
+    parser.add_argument('--delimiter', default=';', help="CSV delimiter")
+    args = parser.parse_args(argv)
+
+    stress = StressTest(shock_grid(args.rate_shocks, args.term_shocks), args.pti_limit)
+    summary = stress.run(args.input, args.output, args.details, args.chart, args.chunk_size, args.delimiter)
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
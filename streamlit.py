@@ -1,7 +1,18 @@
+import io
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import yaml
 from functools import partial
 from MortgageClass import MortgageCalculator
+from CacheClass import ScenarioCache, scenario_key, file_digest
+from PortfolioClass import sensitivity_grid, grid_axis
+from ScenarioClass import ScenarioSet
+from AffordabilitySolver import max_house_price, min_cash, max_interest_rate
+from PrepaymentClass import PrepaymentPlan
+from BackgroundClass import BackgroundRunner
+from ProfilerClass import Profiler, use, get_profiler, stage
 import pandas as pd
 import numpy as np  
 
@@ -32,6 +43,15 @@ box_gap = "32px"
 # Set page configuration
 st.set_page_config(layout="wide")
 
+# Opt-in rerun profiling: per session (sidebar checkbox) or for the whole process (MORTGAGE_PROFILE=1)
+if st.session_state.get("profile_reruns"):
+    if "profiler" not in st.session_state:
+        st.session_state["profiler"] = Profiler()
+    use(st.session_state["profiler"])
+else:
+    use(None)
+rerun_profiler = get_profiler()
+
 st.markdown(f"""
     <style>
     .appview-container .main .block-container {{
@@ -99,102 +119,83 @@ def on_slider_change(key, params):
 def format_thousands_dot(number):
     return f"{number:,.0f}".replace(",", ".")
 
-############################
-###       Sidebar        ###
-############################
-
-st.title("Mortgage Calculator")
-
-with st.sidebar:
-    st.header("Mortgage Input")
-    for key in params_keys:
-        st.write(f"{params[key]["title"]} ({params[key]["unit"]})")
-        
-        cols = st.columns([5, 2])  # Adjust ratio as needed (slider, text)
-        
-        with cols[0]:
-            st.slider(
-                label=f'{params[key]["title"]} Slider ({params[key]["unit"]})',
-                min_value=params[key]["min"],
-                max_value=params[key]["max"],
-                step=params[key]["step"],
-                value=st.session_state[key],
-                key=f"{key}_slider",
-                on_change=partial(on_slider_change, key, params),
-                label_visibility="collapsed"
-            )
-        with cols[1]:
-            st.text_input(
-                label=f'{params[key]["title"]} Slider ({params[key]["unit"]})',
-                value=st.session_state[f"{key}_text"],
-                key=f"{key}_text",
-                on_change=partial(on_text_change, key, params),
-                label_visibility="collapsed"
-            )
-
-############################
-###       Backend        ###
-############################
-
-house_price = st.session_state.get("house_price", 425000)
-cash = st.session_state.get("cash", 70000)
-interest_rate = st.session_state.get("interest_rate", 1.8)
-loan_term_years = st.session_state.get("years", 30)
-cost = st.session_state.get("cost", 2000)
-taxes = st.session_state.get("taxes", 6)
-bank_fees = st.session_state.get("bank_fees", 2000)
-bank_fees_monthly = st.session_state.get("bank_fees_monthly", 50)
-
-mortgage = MortgageCalculator(house_price, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)
-mortgage.run()
-mortgage.get_amortization_schedule()
-
-# Values
-property_cost = mortgage.house_price + mortgage.taxes_cost_fees
-down_payment = mortgage.down_payment
-mortgage_amount = mortgage.total_mortgage
-interest_paid = mortgage.total_interest_paid
-principal_paid = down_payment + mortgage_amount
-apr = mortgage.apr
-total_cost_with_mortgage = principal_paid + interest_paid
-
-# Bar 1 (Price): width is as long as principal_paid (down_payment + mortgage), segments are house and taxes
-bar1_width = principal_paid / total_cost_with_mortgage * 100
-bar1_house = mortgage.house_price / total_cost_with_mortgage * 100
-bar1_taxes = mortgage.taxes_cost_fees / total_cost_with_mortgage * 100
-
-# Bar 2 (Interest): full width, segments are down payment, mortgage, interest
-bar2_down = down_payment / total_cost_with_mortgage * 100
-bar2_mortgage = mortgage_amount / total_cost_with_mortgage * 100
-bar2_interest = interest_paid / total_cost_with_mortgage * 100
-
-# Format values for display
-price_str = format_thousands_dot(mortgage.house_price)
-taxes_str = format_thousands_dot(mortgage.taxes_cost_fees)
-total_cost_str = format_thousands_dot(mortgage.total_cost)
-down_payment_str = format_thousands_dot(mortgage.down_payment)
-total_mortgage_str = format_thousands_dot(mortgage.total_mortgage)
-total_interest_paid_str = format_thousands_dot(mortgage.total_interest_paid)
-bank_fees_monthly_str = format_thousands_dot(mortgage.bank_fees_monthly)
-apr_str = format_thousands_dot(mortgage.apr)
-total_str = format_thousands_dot(mortgage.total_paid + mortgage.down_payment + mortgage.total_interest_paid)
-
-#############################
-####       1st Box        ###
-#############################
-
-col1, col2, col3 = st.columns([2, 2, 3.5])  # Adjust ratios as needed (center box is wider)
+@st.cache_resource
+def get_scenario_cache():
+    return ScenarioCache(max_entries=64, max_bytes=64 * 2**20)
+
+@st.cache_resource
+def get_background_executor():
+    # Shared by all sessions; each session keeps its own runner so it only cancels its own work
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="mortgage-background")
+
+def get_background_runner():
+    if "background" not in st.session_state:
+        st.session_state["background"] = BackgroundRunner(get_background_executor())
+        st.session_state["graphics_lock"] = threading.Lock()
+    return st.session_state["background"]
+
+def wait_for(job, name, status):
+    """Block the script until step `name` of a background job is ready.
+
+    The status line is refreshed while waiting, which also lets Streamlit stop this
+    run as soon as the inputs change.
+    """
+    start = time.perf_counter()
+    while not job.wait(name, timeout=0.1):
+        if job.finished or job.cancelled:
+            break
+        status.caption(f"Computing {name.replace('_', ' ')}... {time.perf_counter() - start:.1f} s")
+    status.empty()
+    return job.result(name)
+
+def quick_quote(*args, **kwargs):
+    """Closed-form figures only (payment, down payment, financing), shown before the schedule is ready."""
+    quote = MortgageCalculator(*args, **kwargs)
+    quote.calculate_mortgage_payment()
+    quote.calculate_totals()
+    return quote
+
+def run_mortgage(*args, **kwargs):
+    mortgage = MortgageCalculator(*args, **kwargs)
+    mortgage.run()
+    mortgage.get_amortization_schedule()
+    return mortgage
+
+def read_prepayments(data):
+    return PrepaymentPlan.from_csv(io.BytesIO(data), delimiter=";")
+
+def payment_header(mortgage):
+    """Summary box header with the monthly payment plus fees."""
+    return f"""
+        <div style="font-size:20px; font-weight:bold; text-align:center; margin-bottom:8px;">Monthly Payment</div>
+        <div style="font-size:32px; font-weight:bold; color: {color_text}; text-align:center; margin-bottom:12px;">{mortgage.monthly_payment:.2f} + {mortgage.bank_fees_monthly:.2f} €</div>"""
 
-with col1:
-    st.markdown(f"""
+def payment_change_header(mortgage):
+    """Summary box header with the initial and final payment, for scenarios with extra amortization."""
+    return f"""
+        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 12px;">
+        <div>
+            <div style="font-size:16px; font-weight:bold; color: {color_text_second}; text-align:left; margin-bottom:8px;">Initial Payment</div>
+            <div style="font-size:20px; font-weight:bold; color: {color_text_second}; text-align:left;">{mortgage.initial_monthly_payment:.2f} €</div>
+        </div>
+        <div>
+            <div style="font-size:20px; font-weight:bold; text-align:right; margin-bottom:8px;">Final Payment</div>
+            <div style="font-size:32px; font-weight:bold; color: {color_text}; text-align:right;">{mortgage.monthly_payment:.2f} €</div>
+        </div>
+        </div>"""
+
+def key_figures_box(mortgage, header, apr):
+    """HTML of the key figures box; only needs the closed-form figures, `apr` is preformatted text."""
+    down_payment_str = format_thousands_dot(mortgage.down_payment)
+    total_mortgage_str = format_thousands_dot(mortgage.total_mortgage)
+    bank_fees_monthly_str = format_thousands_dot(mortgage.bank_fees_monthly)
+    return f"""
         <div style="border:3px solid {color_line};
             border-radius:8px;
             padding:16px;
             background-color:{color_bg};
             margin-bottom: {box_gap};
-    ">
-        <div style="font-size:20px; font-weight:bold; text-align:center; margin-bottom:8px;">Monthly Payment</div>
-        <div style="font-size:32px; font-weight:bold; color: {color_text}; text-align:center; margin-bottom:12px;">{mortgage.monthly_payment:.2f} + {mortgage.bank_fees_monthly:.2f} €</div>
+    ">{header}
         <div style="display:flex; justify-content:space-between; margin-bottom:4px; font-weight:bold;">
             <span>Mortgage Amount</span>
             <span style="font-weight:bold;">{total_mortgage_str} €</span>
@@ -213,15 +214,42 @@ with col1:
         </div>
         <div style="display:flex; justify-content:space-between; margin-bottom:4px; font-weight:bold;">
             <span>APR</span>
-            <span style="font-weight:bold;">{mortgage.apr:.2f} %</span>
-        </div>""", unsafe_allow_html=True)
-    
-
-#############################
-####       2nd Box        ###
-#############################
-
-    st.markdown(f"""
+            <span style="font-weight:bold;">{apr}</span>
+        </div>"""
+
+def pending_box(text):
+    return f"""
+    <div style="border:3px solid {color_line}; border-radius:8px; padding:16px; background-color:{color_bg}; color:{color_text_second};">{text}</div>"""
+
+def summary_boxes(mortgage, header):
+    """HTML of the two summary boxes of a scenario: key figures under `header`, then the cost breakdown."""
+    down_payment = mortgage.down_payment
+    mortgage_amount = mortgage.total_mortgage
+    interest_paid = mortgage.total_interest_paid
+    principal_paid = down_payment + mortgage_amount
+    total_cost_with_mortgage = principal_paid + interest_paid
+
+    # Bar 1 (Price): width is as long as principal_paid (down_payment + mortgage), segments are house and taxes
+    bar1_width = principal_paid / total_cost_with_mortgage * 100
+    bar1_house = mortgage.house_price / total_cost_with_mortgage * 100
+    bar1_taxes = mortgage.taxes_cost_fees / total_cost_with_mortgage * 100
+
+    # Bar 2 (Interest): full width, segments are down payment, mortgage, interest
+    bar2_down = down_payment / total_cost_with_mortgage * 100
+    bar2_mortgage = mortgage_amount / total_cost_with_mortgage * 100
+    bar2_interest = interest_paid / total_cost_with_mortgage * 100
+
+    # Format values for display
+    price_str = format_thousands_dot(mortgage.house_price)
+    taxes_str = format_thousands_dot(mortgage.taxes_cost_fees)
+    total_cost_str = format_thousands_dot(mortgage.total_cost)
+    down_payment_str = format_thousands_dot(mortgage.down_payment)
+    total_mortgage_str = format_thousands_dot(mortgage.total_mortgage)
+    total_interest_paid_str = format_thousands_dot(mortgage.total_interest_paid)
+    total_str = format_thousands_dot(mortgage.total_paid + mortgage.down_payment + mortgage.total_interest_paid)
+
+    key_figures = key_figures_box(mortgage, header, f"{mortgage.apr:.2f} %")
+    breakdown = f"""
     <div style="border:3px solid {color_line};
                 border-radius:8px;
                 padding:16px;
@@ -267,178 +295,292 @@ with col1:
             <span>{total_str} €</span>
         </div>
     </div>
-    """, unsafe_allow_html=True)
-
-    uploaded_file = st.file_uploader("Drop your amortization CSV file here", type=["csv"])
-
-    if uploaded_file is not None:
-        amortization_df = pd.read_csv(uploaded_file, delimiter=";")
-        st.write('Calculating amortization with provided data...')
-    else:
-        amortization_df = pd.DataFrame({
-                                    "Month": list(np.arange(1, loan_term_years*12 + 1)),
-                                    "Amortization": [0] * (loan_term_years * 12),
-                                    "Type": [np.nan] * (loan_term_years * 12)
-                                })
-        st.write('No data provided, using zero additional amortization.')
-        
-############################
-###       Backend        ###
-############################
+    """
+    return key_figures, breakdown
+
+if rerun_profiler is not None:
+    rerun_profiler.begin("rerun")
+try:
+    ############################
+    ###       Sidebar        ###
+    ############################
+
+    st.title("Mortgage Calculator")
+
+    with st.sidebar:
+        st.header("Mortgage Input")
+        for key in params_keys:
+            st.write(f"{params[key]["title"]} ({params[key]["unit"]})")
+
+            cols = st.columns([5, 2])  # Adjust ratio as needed (slider, text)
+
+            with cols[0]:
+                st.slider(
+                    label=f'{params[key]["title"]} Slider ({params[key]["unit"]})',
+                    min_value=params[key]["min"],
+                    max_value=params[key]["max"],
+                    step=params[key]["step"],
+                    value=st.session_state[key],
+                    key=f"{key}_slider",
+                    on_change=partial(on_slider_change, key, params),
+                    label_visibility="collapsed"
+                )
+            with cols[1]:
+                st.text_input(
+                    label=f'{params[key]["title"]} Slider ({params[key]["unit"]})',
+                    value=st.session_state[f"{key}_text"],
+                    key=f"{key}_text",
+                    on_change=partial(on_text_change, key, params),
+                    label_visibility="collapsed"
+                )
+
+    ############################
+    ###       Backend        ###
+    ############################
+
+    house_price = st.session_state.get("house_price", 425000)
+    cash = st.session_state.get("cash", 70000)
+    interest_rate = st.session_state.get("interest_rate", 1.8)
+    loan_term_years = st.session_state.get("years", 30)
+    cost = st.session_state.get("cost", 2000)
+    taxes = st.session_state.get("taxes", 6)
+    bank_fees = st.session_state.get("bank_fees", 2000)
+    bank_fees_monthly = st.session_state.get("bank_fees_monthly", 50)
+
+    scenario_cache = get_scenario_cache()
+    scenario = scenario_key(house_price, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)
+    sensitivity_axes = (grid_axis(params["interest_rate"]), grid_axis(params["years"]), grid_axis(params["cash"]))
+
+    # Closed-form figures are shown right away; schedules, APR and charts follow from a background job
+    quote = quick_quote(house_price, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)
+    status = st.empty()
+
+    #############################
+    ####       1st Box        ###
+    #############################
+
+    col1, col2, col3 = st.columns([2, 2, 3.5])  # Adjust ratios as needed (center box is wider)
+
+    with col1:
+        current_key_figures = st.empty()
+        current_key_figures.markdown(key_figures_box(quote, payment_header(quote), "..."), unsafe_allow_html=True)
+
+    #############################
+    ####       2nd Box        ###
+    #############################
+
+        current_breakdown = st.empty()
+        current_breakdown.markdown(pending_box("Computing amortization schedule..."), unsafe_allow_html=True)
+
+
+        uploaded_file = st.file_uploader("Drop your amortization CSV file here", type=["csv"])
+
+        prepayments = None
+        amortization_digest = None
+        if uploaded_file is not None:
+            # Parsed and validated once per file; bad rows are reported instead of failing the page
+            amortization_digest = file_digest(uploaded_file.getvalue())
+            try:
+                prepayments = scenario_cache.get(("prepayments", amortization_digest), partial(read_prepayments, uploaded_file.getvalue()))
+                st.write(f'Calculating amortization with {len(prepayments)} extra payments...')
+            except ValueError as error:
+                st.error(str(error))
+                amortization_digest = None
+        if prepayments is None:
+            st.write('No data provided, using zero additional amortization.')
+
+    with col2:
+        enhanced_key_figures = st.empty()
+        enhanced_key_figures.markdown(key_figures_box(quote, payment_header(quote), "..."), unsafe_allow_html=True)
+        enhanced_breakdown = st.empty()
+        enhanced_breakdown.markdown(pending_box("Computing amortization schedule..."), unsafe_allow_html=True)
+
+    #############################
+    ####       Graphs         ###
+    #############################
+
+    from GraphicClass import GraphicClass
+
+    params = {
+        'color_side': "#212121",
+        'color_bg': "#616161",
+        'color_box': "#e0e0e0",
+        'color_line': "#FFFFFF",
+        'color_text': "#FFFFFF",
+        'color_text_second': "#707070",
+        'color_text_third': "#202020",
+        'color_bar_price_1': "#D1E3F8",
+        'color_bar_price_2': "#7AA9F7",
+        'color_bar_price_3': "#2E5CB8",
+        'color_bar_interest_1': "#f8d1d1",
+        'color_bar_interest_2': "#f89696",
+        'color_bar_interest_3': "#fa4f4f",
+        'box_width': "400px",
+        'box_gap': "32px"
+    }
+
+    # The figure skeleton lives in the session; reruns only swap the trace data
+    payment_chart_names = ["Current", "With amortization"]
+    chart_aggregations = {"Yearly": "yearly", "Quarterly": "quarterly", "Monthly": "monthly", "Adaptive (LTTB)": "lttb"}
+    chart_aggregation = chart_aggregations[st.session_state.get("chart_aggregation", "Yearly")]
+    background = get_background_runner()
+    graphics = st.session_state.get("graphics")
+    if graphics is None:
+        graphics = GraphicClass(params=params, names=payment_chart_names, max_points=120)
+        st.session_state["graphics"] = graphics
+    graphics_lock = st.session_state["graphics_lock"]
+
+    ############################
+    ###       Backend        ###
+    ############################
+
+    def compute_mortgage(results):
+        with stage("mortgage"):
+            return scenario_cache.get(
+                ("mortgage",) + scenario,
+                partial(run_mortgage, house_price, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly)
+            )
 
-mortgage_enhanced_amortization = MortgageCalculator(house_price, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly, amortization_schedule_df=amortization_df)
-mortgage_enhanced_amortization.run()
-mortgage_enhanced_amortization.get_amortization_schedule()
-
-# Values
-property_cost_enhanced_amortization = mortgage_enhanced_amortization.house_price + mortgage_enhanced_amortization.taxes_cost_fees
-down_payment_enhanced_amortization = mortgage_enhanced_amortization.down_payment
-mortgage_amount_enhanced_amortization = mortgage_enhanced_amortization.total_mortgage
-interest_paid_enhanced_amortization = mortgage_enhanced_amortization.total_interest_paid
-principal_paid_enhanced_amortization = down_payment_enhanced_amortization + mortgage_amount_enhanced_amortization
-apr__enhanced_amortization = mortgage_enhanced_amortization.apr
-total_cost_with_mortgage_enhanced_amortization = principal_paid_enhanced_amortization + interest_paid_enhanced_amortization
-
-# Bar 1 (Price): width is as long as principal_paid (down_payment + mortgage), segments are house and taxes
-bar1_width_enhanced_amortization = principal_paid_enhanced_amortization / total_cost_with_mortgage_enhanced_amortization * 100
-bar1_house_enhanced_amortization = mortgage_enhanced_amortization.house_price / total_cost_with_mortgage_enhanced_amortization * 100
-bar1_taxes_enhanced_amortization = mortgage_enhanced_amortization.taxes_cost_fees / total_cost_with_mortgage_enhanced_amortization * 100
-
-# Bar 2 (Interest): full width, segments are down payment, mortgage, interest
-bar2_down_enhanced_amortization = down_payment_enhanced_amortization / total_cost_with_mortgage_enhanced_amortization * 100
-bar2_mortgage_enhanced_amortization = mortgage_amount_enhanced_amortization / total_cost_with_mortgage_enhanced_amortization * 100
-bar2_interest_enhanced_amortization = interest_paid_enhanced_amortization / total_cost_with_mortgage_enhanced_amortization * 100
-
-# Format values for display
-price_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.house_price)
-taxes_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.taxes_cost_fees)
-total_cost_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.total_cost)
-down_payment_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.down_payment)
-total_mortgage_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.total_mortgage)
-total_interest_paid_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.total_interest_paid)
-bank_fees_monthly_str_enhanced_amrotization = format_thousands_dot(mortgage_enhanced_amortization.bank_fees_monthly)
-apr_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.apr)
-total_str_enhanced_amortization = format_thousands_dot(mortgage_enhanced_amortization.total_paid + mortgage_enhanced_amortization.down_payment + mortgage_enhanced_amortization.total_interest_paid)
-
-with col2:
-        
-    st.markdown(f"""
-        <div style="border:3px solid {color_line};
-            border-radius:8px;
-            padding:16px;
-            background-color:{color_bg};
-            margin-bottom: {box_gap};
-    ">
-        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 12px;">
-        <div>
-            <div style="font-size:16px; font-weight:bold; color: {color_text_second}; text-align:left; margin-bottom:8px;">Initial Payment</div>
-            <div style="font-size:20px; font-weight:bold; color: {color_text_second}; text-align:left;">{mortgage_enhanced_amortization.initial_monthly_payment:.2f} €</div>
-        </div>
-        <div>
-            <div style="font-size:20px; font-weight:bold; text-align:right; margin-bottom:8px;">Final Payment</div>
-            <div style="font-size:32px; font-weight:bold; color: {color_text}; text-align:right;">{mortgage_enhanced_amortization.monthly_payment:.2f} €</div>
-        </div>
-        </div>
-        <div style="display:flex; justify-content:space-between; margin-bottom:4px; font-weight:bold;">
-            <span>Mortgage Amount</span>
-            <span style="font-weight:bold;">{total_mortgage_str_enhanced_amortization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; margin-bottom:4px; font-weight:bold;">
-            <span>Down Payment</span>
-            <span style="font-weight:bold;">{down_payment_str_enhanced_amortization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; margin-bottom:4px; font-weight:bold;">
-            <span>Monthly fees</span>
-            <span style="font-weight:bold;">{bank_fees_monthly_str_enhanced_amrotization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; margin-bottom:4px; font-weight:bold;">
-            <span>Financing Percentage</span>
-            <span style="font-weight:bold;">{mortgage_enhanced_amortization.financing_percentage:.0f} %</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; margin-bottom:4px; font-weight:bold;">
-            <span>APR</span>
-            <span style="font-weight:bold;">{mortgage_enhanced_amortization.apr:.2f} %</span>
-        </div>""", unsafe_allow_html=True)
+    def compute_mortgage_enhanced(results):
+        with stage("mortgage_enhanced"):
+            return scenario_cache.get(
+                ("mortgage_enhanced",) + scenario + (amortization_digest,),
+                partial(run_mortgage, house_price, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly, amortization_schedule_df=prepayments)
+            )
 
-#############################
-####       2nd Box        ###
-#############################
+    def compute_chart(results):
+        # A stale job may still be drawing into the shared skeleton
+        with stage("chart_build"), graphics_lock:
+            graphics.set_mortgages([results["mortgage"], results["mortgage_enhanced"]], payment_chart_names)
+            graphics.aggregation = chart_aggregation
+            return graphics.monthly_payment_graph()
+
+    def compute_sensitivity(results):
+        # Interest rate x term x cash grid over the full slider ranges
+        with stage("sensitivity_grid"):
+            return scenario_cache.get(
+                ("sensitivity",) + scenario_key(house_price, cost, taxes, bank_fees, bank_fees_monthly),
+                partial(sensitivity_grid, house_price, *sensitivity_axes, cost, taxes, bank_fees, bank_fees_monthly)
+            )
+
+    # Same inputs as the job in flight (e.g. after an unrelated widget change): keep waiting on it; new inputs cancel it
+    job = background.submit(
+        ("main",) + scenario + (amortization_digest, chart_aggregation),
+        [("mortgage", compute_mortgage), ("mortgage_enhanced", compute_mortgage_enhanced), ("chart", compute_chart), ("sensitivity", compute_sensitivity)]
+    )
+
+    # Inverse problem: what fits a monthly budget (payment plus monthly fees) with the other inputs fixed
+    with st.sidebar.expander("Affordability"):
+        target_payment = st.number_input("Monthly budget (€)", min_value=0.0, value=float(round(quote.monthly_payment + bank_fees_monthly)), step=50.0, key="target_payment")
+        affordable_price = float(max_house_price(target_payment, cash, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly))
+        needed_cash = float(min_cash(target_payment, house_price, interest_rate, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly))
+        highest_rate = float(max_interest_rate(target_payment, house_price, cash, loan_term_years, cost, taxes, bank_fees, bank_fees_monthly))
+        st.write(f"Max house price: {format_thousands_dot(affordable_price) if np.isfinite(affordable_price) else '-'} €")
+        st.write(f"Min cash for this house: {format_thousands_dot(needed_cash) if np.isfinite(needed_cash) else '-'} €")
+        st.write(f"Max interest rate for this house: {f'{highest_rate:.2f}' if np.isfinite(highest_rate) else '-'} %")
+
+    with col3:
+        chart = st.empty()
+        chart.info("Building chart...")
+        st.selectbox("Chart resolution", list(chart_aggregations), key="chart_aggregation")
+
+        sensitivity_metrics = {"Monthly Payment": "monthly_payment", "Total Interest": "total_interest_paid", "APR": "apr"}
+        sensitivity_metric = st.selectbox("Sensitivity", list(sensitivity_metrics), key="sensitivity_metric")
+        heatmap = st.empty()
+
+    # Fill in the boxes and charts as the background steps finish
+    mortgage = wait_for(job, "mortgage", status)
+    key_figures, breakdown = summary_boxes(mortgage, payment_header(mortgage))
+    current_key_figures.markdown(key_figures, unsafe_allow_html=True)
+    current_breakdown.markdown(breakdown, unsafe_allow_html=True)
+
+    mortgage_enhanced_amortization = wait_for(job, "mortgage_enhanced", status)
+    key_figures, breakdown = summary_boxes(mortgage_enhanced_amortization, payment_change_header(mortgage_enhanced_amortization))
+    enhanced_key_figures.markdown(key_figures, unsafe_allow_html=True)
+    enhanced_breakdown.markdown(breakdown, unsafe_allow_html=True)
+
+    bars = wait_for(job, "chart", status)
+    with stage("chart_render"):
+        chart.plotly_chart(bars, use_container_width=True)
+
+    sensitivity = wait_for(job, "sensitivity", status)
+    with stage("heatmap_render"):
+        heatmap.plotly_chart(graphics.sensitivity_heatmap(sensitivity, sensitivity_metrics[sensitivity_metric]), use_container_width=True)
+
+    cache_stats = scenario_cache.stats()
+    st.sidebar.caption(f"Scenario cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['entries']} entries, "
+                       f"{background.cancelled} stale jobs cancelled")
+
+    #############################
+    ####   Offer comparison   ###
+    #############################
+
+    def default_offers():
+        return pd.DataFrame({
+            "name": ["Current", "Other bank", "With amortization"],
+            "interest_rate": [interest_rate, interest_rate + 0.3, interest_rate],
+            "loan_term_years": [loan_term_years] * 3,
+            "bank_fees": [bank_fees, 0, bank_fees],
+            "bank_fees_monthly": [bank_fees_monthly, 0, bank_fees_monthly],
+            "extra_amortization": [False, False, True],
+        })
+
+    def run_offers(offers, prepayments):
+        # All offers share the sidebar inputs and are priced in one batch
+        scenarios = ScenarioSet(dict(house_price=house_price, cash=cash, interest_rate=interest_rate, loan_term_years=loan_term_years,
+                                     cost=cost, taxes=taxes, bank_fees=bank_fees, bank_fees_monthly=bank_fees_monthly))
+        for offer in offers.to_dict("records"):
+            scenarios.add(offer["name"], prepayments if offer["extra_amortization"] else None,
+                          interest_rate=offer["interest_rate"], loan_term_years=offer["loan_term_years"],
+                          bank_fees=offer["bank_fees"], bank_fees_monthly=offer["bank_fees_monthly"])
+        scenarios.run()
+        return scenarios
+
+    st.header("Compare Offers")
+    offers = st.data_editor(default_offers(), num_rows="dynamic", hide_index=True, key="offers", use_container_width=True)
+    # Rows added in the editor start empty; missing values fall back to the sidebar inputs
+    offers = offers.dropna(subset=["name"]).drop_duplicates(subset=["name"]).fillna({
+        "interest_rate": interest_rate, "loan_term_years": loan_term_years, "bank_fees": bank_fees,
+        "bank_fees_monthly": bank_fees_monthly, "extra_amortization": False,
+    })
+
+    if len(offers):
+        with stage("offers"):
+            offer_set = scenario_cache.get(
+                ("offers",) + scenario + (amortization_digest,) + tuple(scenario_key(*row) for row in offers.itertuples(index=False)),
+                partial(run_offers, offers, prepayments)
+            )
+        baseline = st.selectbox("Baseline", offer_set.names, key="offers_baseline")
+        st.dataframe(offer_set.to_frame(baseline).round(2).T, use_container_width=True)
+
+        with stage("offers_chart_build"):
+            offer_graphics = st.session_state.get("offer_graphics")
+            if offer_graphics is None:
+                offer_graphics = GraphicClass(offer_set.scenarios(), params, max_points=120)
+                st.session_state["offer_graphics"] = offer_graphics
+            else:
+                offer_graphics.set_mortgages(offer_set.scenarios())
+            offer_graphics.aggregation = chart_aggregations[st.session_state.get("chart_aggregation", "Yearly")]
+            diff_chart = offer_graphics.scenario_diff_graph(offer_set.diff(baseline), title=f"Lifetime cost vs. {baseline} (€)")
+            balance_chart = offer_graphics.balance_graph()
+
+        offer_cols = st.columns(2)
+        with offer_cols[0]:
+            st.plotly_chart(diff_chart, use_container_width=True)
+        with offer_cols[1]:
+            st.plotly_chart(balance_chart, use_container_width=True)
+finally:
+    # Also closes the recording when the run raises or is stopped (st.stop, rerun)
+    if rerun_profiler is not None:
+        rerun_profiler.end()
 
-    st.markdown(f"""
-    <div style="border:3px solid {color_line};
-                border-radius:8px;
-                padding:16px;
-                background-color:{color_bg};
-                ">
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <span style="color:{color_bar_price_1}; font-weight:bold;">House Price</span>
-            <span style="font-weight:bold;">{price_str_enhanced_amortization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <span style="color:{color_bar_price_2}; font-weight:bold;">Taxes and Additional Costs</span>
-            <span>{taxes_str_enhanced_amortization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; align-items:center; font-weight:bold; margin-bottom:8px;">
-            <span>Total Cost of Property</span>
-            <span>{total_cost_str_enhanced_amortization} €</span>
-        </div>                    
-        <!-- Top bar: House Price + Additional Costs (aligned with principal paid) -->
-        <div style="height:18px; width:{bar1_width_enhanced_amortization}%; background:{color_bar_price_2}; border-radius:6px; position:relative; margin:16px 0 8px 0; overflow:hidden;">
-            <div style="height:100%; width:{bar1_house_enhanced_amortization}%; background:{color_bar_price_1}; border-radius:6px 0 0 6px; display:inline-block; float:left;"></div>
-            <div style="height:100%; width:{bar1_taxes_enhanced_amortization}%; background:{color_bar_price_2}; border-radius:0 6px 6px 0; display:inline-block; float:left;"></div>
-        </div>
-        <!-- Bottom bar: Down Payment + Mortgage + Interest -->
-        <div style="height:18px; width:100%; background:{color_bg}; border-radius:6px; position:relative; margin-bottom:8px; overflow:hidden;">
-            <div style="height:100%; width:{bar2_down_enhanced_amortization}%; background:{color_bar_interest_1}; border-radius:6px 0 0 6px; display:inline-block; float:left;"></div>
-            <div style="height:100%; width:{bar2_mortgage_enhanced_amortization}%; background:{color_bar_interest_2}; display:inline-block; float:left;"></div>
-            <div style="height:100%; width:{bar2_interest_enhanced_amortization}%; background:{color_bar_interest_3}; border-radius:0 6px 6px 0; display:inline-block; float:left;"></div>
-        </div>
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <span style="color:{color_bar_interest_1};font-weight:bold;">Down Payment</span>
-            <span>{down_payment_str_enhanced_amortization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <span style="color:{color_bar_interest_2};font-weight:bold;">Mortgage Amount</span>
-            <span>{total_mortgage_str_enhanced_amortization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-            <span style="color:{color_bar_interest_3};font-weight:bold;">Mortgage Interest</span>
-            <span>{total_interest_paid_str_enhanced_amortization} €</span>
-        </div>
-        <div style="display:flex; justify-content:space-between; align-items:center; font-weight:bold; margin-top:8px;">
-            <span>Total Cost with Mortgage</span>
-            <span>{total_str_enhanced_amortization} €</span>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-    
 #############################
-####       Graphs         ###
+####     Debug panel      ###
 #############################
 
-from GraphicClass import GraphicClass
-from GraphicClass import GraphicClass
-
-params = {
-    'color_side': "#212121",
-    'color_bg': "#616161",
-    'color_box': "#e0e0e0",
-    'color_line': "#FFFFFF",
-    'color_text': "#FFFFFF",
-    'color_text_second': "#707070",
-    'color_text_third': "#202020",
-    'color_bar_price_1': "#D1E3F8",
-    'color_bar_price_2': "#7AA9F7",
-    'color_bar_price_3': "#2E5CB8",
-    'color_bar_interest_1': "#f8d1d1",
-    'color_bar_interest_2': "#f89696",
-    'color_bar_interest_3': "#fa4f4f",
-    'box_width': "400px",
-    'box_gap': "32px"
-}
-
-graphics = GraphicClass(mortgage, mortgage_enhanced_amortization, params)
-bars = graphics.monthly_payment_graph()
-
-with col3:
-    st.plotly_chart(bars, use_container_width=True)
+with st.sidebar.expander("Performance"):
+    st.checkbox("Profile reruns of this session", key="profile_reruns")
+    if rerun_profiler is not None:
+        reruns = [{"time": run["time"], "total_ms": run["total_ms"], **run["stages"], **run["counters"]}
+                  for run in reversed(rerun_profiler.history)]
+        st.dataframe(pd.DataFrame(reruns).round(2), hide_index=True)
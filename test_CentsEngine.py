@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from CentsEngine import cents_schedule, cents_summary
+from PortfolioClass import MortgagePortfolio
+
+
+def schedule_totals(debt, monthly_rate, months, rounding):
+    schedule, state = cents_schedule(debt, monthly_rate, months, rounding=rounding)
+    return {
+        'monthly_payment': schedule.initial_state['monthly_payment'],
+        'last_payment': schedule.column('total_payment')[-1],
+        'total_interest_paid': state['total_interest_paid'],
+        'payments': len(schedule),
+    }
+
+
+@pytest.mark.parametrize('rounding', ['half_even', 'half_up'])
+def test_summary_matches_schedule(rounding):
+    rng = np.random.default_rng(0)
+    debt = rng.uniform(1000, 900000, 50).round(2)
+    monthly_rate = rng.uniform(0, 6, 50).round(2) / 1200
+    months = rng.integers(1, 481, 50)
+    summary = cents_summary(debt, monthly_rate, months, rounding)
+    for i in range(50):
+        expected = schedule_totals(debt[i], monthly_rate[i], months[i], rounding)
+        for name, value in expected.items():
+            assert summary[name][i] == pytest.approx(value, abs=1e-9)
+
+
+@pytest.mark.parametrize('rounding', ['half_even', 'half_up'])
+def test_summary_scalar(rounding):
+    summary = cents_summary(355500, 1.8 / 1200, 360, rounding)
+    expected = schedule_totals(355500, 1.8 / 1200, 360, rounding)
+    for name, value in expected.items():
+        assert np.shape(summary[name]) == ()
+        assert summary[name] == pytest.approx(value, abs=1e-9)
+
+
+def test_summary_grid():
+    monthly_rate = np.array([0.5, 1.8, 3.25, 6]) / 1200
+    months = np.array([120, 240, 360])
+    summary = cents_summary(355500, monthly_rate[:, np.newaxis], months[np.newaxis, :], 'half_even')
+    for name, values in summary.items():
+        assert values.shape == (4, 3)
+    for i, rate in enumerate(monthly_rate):
+        for j, term in enumerate(months):
+            expected = schedule_totals(355500, rate, term, 'half_even')
+            assert summary['total_interest_paid'][i, j] == pytest.approx(expected['total_interest_paid'], abs=1e-9)
+            assert summary['last_payment'][i, j] == pytest.approx(expected['last_payment'], abs=1e-9)
+
+
+def test_portfolio_shapes():
+    scalar = MortgagePortfolio(425000, 70000, 1.8, 30, 2000, 6, 2000, 50, rounding='half_even')
+    scalar.run()
+    grid = MortgagePortfolio(425000, 70000, np.array([1.8, 3.0])[:, np.newaxis], np.array([20, 30]), 2000, 6, 2000, 50, rounding='half_even')
+    grid.run()
+    assert np.shape(scalar.total_interest_paid) == ()
+    assert grid.total_interest_paid.shape == (2, 2)
+    assert grid.total_interest_paid[0, 1] == scalar.total_interest_paid
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from MortgageClass import MortgageCalculator
+from SimulationClass import VariableRateSimulation, RandomWalkModel, VasicekModel
+
+
+@pytest.mark.parametrize('model', [RandomWalkModel(1.8, 0), VasicekModel(1.8, 1.8, 0.3, 0)])
+def test_zero_volatility_matches_calculator(model):
+    mortgage = MortgageCalculator(425000, 70000, 1.8, 30, 2000, 6, 2000, 50)
+    mortgage.run()
+    simulation = VariableRateSimulation(mortgage.debt, 30, model, n_paths=5000, chunk_size=1500, seed=0)
+    result = simulation.run()
+    np.testing.assert_allclose(result['monthly_payment'], mortgage.monthly_payment, atol=0.005)
+    np.testing.assert_allclose(result['total_interest_paid'], mortgage.total_interest_paid, atol=0.005)
+
+
+def test_streaming_percentiles_match_paths():
+    simulation = VariableRateSimulation(300000, 25, RandomWalkModel(1.0, 0.8), spread=1, n_paths=20000, chunk_size=3000, seed=1, keep_paths=True)
+    simulation.run()
+    simulation.keep_paths = False
+    q = np.array([5, 25, 50, 75, 95])
+    streamed = simulation.percentiles(q)
+    # Within a bin (at most 1/8192 of the range) of the exact percentiles of neighbouring ranks
+    for name, paths in (('monthly_payment', simulation.payments), ('total_interest_paid', simulation.total_interest_paid)):
+        tolerance = np.ptp(paths, axis=0) / 2**13
+        low = np.percentile(paths, q - 0.1, axis=0) - tolerance
+        high = np.percentile(paths, q + 0.1, axis=0) + tolerance
+        assert np.all((low <= streamed[name]) & (streamed[name] <= high))